@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+截图路径基准测试
+在假win32层上比较原始截图流程与复用缓冲区的截图池，
+输出每秒帧数和每帧分配的字节数，可在Linux上运行
+
+用法: python benchmarks/bench_capture.py [--frames 300] [--image screenshots/test_screenshot.png]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_win32
+
+
+def capture_legacy(hwnd, x, y, w, h):
+    """原始截图流程：每帧新建DC和位图，经PIL转换"""
+    import win32gui
+    import win32ui
+    import win32con
+    from PIL import Image
+
+    hdc = win32gui.GetDC(hwnd)
+    mfc_dc = win32ui.CreateDCFromHandle(hdc)
+    save_dc = mfc_dc.CreateCompatibleDC()
+    save_bitmap = win32ui.CreateBitmap()
+    save_bitmap.CreateCompatibleBitmap(mfc_dc, w, h)
+    save_dc.SelectObject(save_bitmap)
+    save_dc.BitBlt((0, 0), (w, h), mfc_dc, (x, y), win32con.SRCCOPY)
+
+    bmp_info = save_bitmap.GetInfo()
+    bmp_str = save_bitmap.GetBitmapBits(True)
+    img = Image.frombuffer(
+        'RGB',
+        (bmp_info['bmWidth'], bmp_info['bmHeight']),
+        bmp_str, 'raw', 'BGRX', 0, 1)
+
+    win32gui.DeleteObject(save_bitmap.GetHandle())
+    save_dc.DeleteDC()
+    mfc_dc.DeleteDC()
+    win32gui.ReleaseDC(hwnd, hdc)
+
+    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+
+
+def measure(name, grab, frames):
+    """测量每秒帧数和每帧分配的字节数"""
+    # 预热，排除首次创建GDI对象的开销
+    grab()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        grab()
+    elapsed = time.perf_counter() - start
+
+    # 单独测量内存分配，避免tracemalloc拖慢计时
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(min(frames, 50)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        grab()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    fps = frames / elapsed if elapsed > 0 else float('inf')
+    per_frame = allocated / min(frames, 50)
+    print(f"{name:<28} {fps:>10.1f} fps {elapsed / frames * 1000:>9.3f} ms/帧 {per_frame / 1024:>12.1f} KiB/帧")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图路径基准测试")
+    parser.add_argument('--frames', type=int, default=300, help="每种路径截取的帧数")
+    parser.add_argument('--image', default='screenshots/test_screenshot.png', help="模拟窗口内容的图像")
+    parser.add_argument('--region', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'),
+                        help="截取区域，默认整个窗口")
+    args = parser.parse_args()
+
+    screen = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if screen is None:
+        print(f"无法读取 {args.image}，使用随机图像")
+        screen = np.random.randint(0, 256, (720, 1280, 3), dtype=np.uint8)
+
+    fake_gdi32 = fake_win32.install(screen)
+
+    from core import capture
+
+    height, width = screen.shape[:2]
+    x, y, w, h = args.region if args.region else (0, 0, width, height)
+    hwnd = 1
+
+    print(f"窗口尺寸: {width}x{height}，截取区域: {(x, y, w, h)}，帧数: {args.frames}")
+
+    measure("原始流程 (PIL)", lambda: capture_legacy(hwnd, x, y, w, h), args.frames)
+
+    capture._gdi32 = None
+    pool = capture.GdiCapturePool()
+    measure("截图池 (GetBitmapBits)", lambda: pool.grab(hwnd, x, y, w, h), args.frames)
+    pool.release()
+
+    capture._gdi32 = fake_gdi32
+    pool = capture.GdiCapturePool()
+    measure("截图池 (GetDIBits)", lambda: pool.grab(hwnd, x, y, w, h), args.frames)
+    pool.release()
+
+    # 校验两种流程结果一致
+    legacy = capture_legacy(hwnd, x, y, w, h)
+    pooled = capture.GdiCapturePool().grab(hwnd, x, y, w, h)
+    print(f"结果一致: {np.array_equal(legacy, pooled)}")
+
+
+if __name__ == "__main__":
+    main()
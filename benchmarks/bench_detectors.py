@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+检测流程吞吐量基准测试
+通过ReplayFrameSource回放录制的截图，不需要游戏窗口和pywin32
+
+用法: python benchmarks/bench_detectors.py [--source debug_ocr] [--frames 100] [--ocr]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.capture import ReplayFrameSource
+from core.image import ImageManager
+from utils import get_all_templates
+
+
+def measure(name, func, frames):
+    """重复执行检测函数，输出平均耗时和吞吐量"""
+    start = time.perf_counter()
+    for _ in range(frames):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {elapsed / frames * 1000:>9.3f} ms/次 {frames / elapsed:>10.1f} 次/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测流程吞吐量基准测试")
+    parser.add_argument('--source', default='debug_ocr', help="图片目录或视频文件")
+    parser.add_argument('--templates', default='resources/templates', help="模板目录")
+    parser.add_argument('--frames', type=int, default=100, help="每个检测器运行的帧数")
+    parser.add_argument('--region', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'),
+                        help="检测区域，默认整个画面")
+    parser.add_argument('--ocr', action='store_true', help="同时测试OCR（需要PaddleOCR）")
+    parser.add_argument('--track', action='store_true', help="启用上次位置跟踪")
+    args = parser.parse_args()
+
+    source = ReplayFrameSource(args.source, preload=os.path.isdir(args.source))
+    image_manager = ImageManager(None, frame_source=source)
+    region = tuple(args.region) if args.region else None
+    if args.track:
+        image_manager.enable_location_tracking()
+
+    width, height = source.get_size()
+    print(f"回放来源: {args.source}，画面尺寸: {width}x{height}，每项帧数: {args.frames}")
+
+    measure("capture_screen", lambda: image_manager.capture_screen(region), args.frames)
+
+    templates = get_all_templates(args.templates)
+    for name, path in sorted(templates.items()):
+        measure(f"find_template[{name}]",
+                lambda: image_manager.find_template(path, region=region), args.frames)
+
+    paths = [path for _, path in sorted(templates.items())]
+    measure(f"find_templates[{len(paths)}个]",
+            lambda: image_manager.find_templates(paths, region=region), args.frames)
+
+    measure("find_color", lambda: image_manager.find_color((255, 255, 0), tolerance=30, region=region),
+            args.frames)
+    measure("find_color(probe)", lambda: image_manager.find_color(
+        (255, 255, 0), tolerance=30, region=region, probe=True), args.frames)
+
+    if args.ocr:
+        from core.ocr import OCRManager
+        ocr_manager = OCRManager(None, image_manager, background=False)
+        if ocr_manager.is_ready():
+            measure("recognize_text", lambda: ocr_manager.recognize_text(region), min(args.frames, 10))
+
+    stats = image_manager.template_store.get_stats()
+    print(f"模板缓存: 命中 {stats['hits']} 次，解码 {stats['loads']} 次，"
+          f"节省解码时间 {stats['decode_ms_saved']:.1f} ms")
+
+    stats = image_manager.get_frame_cache_stats()
+    print(f"帧缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+          f"命中率 {stats['hit_rate']:.1%}，节省截图时间 {stats['saved_ms']:.1f} ms")
+
+    tracking_stats = image_manager.get_location_tracking_stats()
+    if tracking_stats:
+        for name, stats in sorted(tracking_stats.items()):
+            print(f"位置跟踪[{os.path.basename(name)}]: 小窗口命中率 {stats['hit_rate']:.1%}，"
+                  f"平均搜索面积 {stats['mean_search_area']:.0f} / {stats['mean_full_area']:.0f} 像素 "
+                  f"({stats['area_ratio']:.1%})")
+
+    source.close()
+
+
+if __name__ == "__main__":
+    main()
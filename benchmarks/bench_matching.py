@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板匹配模式基准测试
+从录制的截图中随机截取图块作为模板，比较各匹配模式的准确率和耗时
+
+用法: python benchmarks/bench_matching.py [--sources debug_ocr screenshots] [--samples 20]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+import cv2
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.matching import match_exact, match_pyramid, downscale, convert_channel
+
+
+def load_screens(sources):
+    """读取目录中的所有截图"""
+    screens = []
+    for source in sources:
+        if not os.path.isdir(source):
+            continue
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                image = cv2.imread(os.path.join(source, name), cv2.IMREAD_COLOR)
+                if image is not None:
+                    screens.append(image)
+    return screens
+
+
+def sample_templates(screens, samples, rng):
+    """随机截取纹理足够丰富的图块，返回 [(画面, 模板, (x, y)), ...]"""
+    cases = []
+    attempts = 0
+    while len(cases) < samples and attempts < samples * 50:
+        attempts += 1
+        screen = rng.choice(screens)
+        height, width = screen.shape[:2]
+        tw = rng.randint(24, 96)
+        th = rng.randint(16, 64)
+        x = rng.randint(0, width - tw)
+        y = rng.randint(0, height - th)
+        template = screen[y:y + th, x:x + tw].copy()
+        if template.std() < 25:
+            continue
+        cases.append((screen, template, (x, y)))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模板匹配模式基准测试")
+    parser.add_argument('--sources', nargs='+', default=['debug_ocr', 'screenshots'], help="截图目录")
+    parser.add_argument('--samples', type=int, default=20, help="测试的模板数量")
+    parser.add_argument('--threshold', type=float, default=0.8, help="匹配阈值")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    screens = load_screens(args.sources)
+    if not screens:
+        print("没有找到截图")
+        return
+    cases = sample_templates(screens, args.samples, random.Random(args.seed))
+    print(f"截图 {len(screens)} 张，模板 {len(cases)} 个，阈值 {args.threshold}")
+
+    modes = [
+        ("exact", lambda screen, template, small: match_exact(screen, template)),
+        ("pyramid 1/2", lambda screen, template, small: match_pyramid(
+            screen, template, args.threshold, 1, small_template=small[1])),
+        ("pyramid 1/4", lambda screen, template, small: match_pyramid(
+            screen, template, args.threshold, 2, small_template=small[2])),
+        # 单通道匹配，耗时包含画面转换
+        ("exact gray", lambda screen, template, small: match_exact(
+            convert_channel(screen, 'gray'), small['gray'])),
+        ("pyramid gray", lambda screen, template, small: match_pyramid(
+            convert_channel(screen, 'gray'), small['gray'], args.threshold, 1, small_template=small['gray1'])),
+    ]
+
+    # 图块可能在画面中重复出现，得分与截取位置的得分相同也算正确
+    for name, func in modes:
+        correct = 0
+        missed = 0
+        elapsed = 0.0
+        for screen, template, (tx, ty) in cases:
+            small = {level: downscale(template, level) for level in (1, 2)}
+            small['gray'] = convert_channel(template, 'gray')
+            small['gray1'] = downscale(small['gray'], 1)
+            start = time.perf_counter()
+            match = func(screen, template, small)
+            elapsed += time.perf_counter() - start
+            if match is None or match[2] < args.threshold:
+                missed += 1
+            elif (abs(match[0] - tx) <= 2 and abs(match[1] - ty) <= 2) or match[2] >= 0.999:
+                correct += 1
+        print(f"{name:<14} 准确率 {correct / len(cases):>7.1%}   漏检率 {missed / len(cases):>7.1%}   "
+              f"平均耗时 {elapsed / len(cases) * 1000:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OCR识别模式基准测试（需要PaddleOCR）
+在录制的OCR输入截图上比较各识别模式的耗时和识别结果数量
+
+用法: python benchmarks/bench_ocr.py [--source debug_ocr] [--region X Y W H] [--repeat 3] [--workers 2]
+'rec'模式把整个区域当作一行文字，应配合--region指定单行文字框
+--workers大于0时再用OCR工作进程池同时提交所有截图，测试并行吞吐量
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.ocr import OCRManager
+from core.ocr_service import OCRService
+
+
+def bench_workers(images, args):
+    """用工作进程池同时提交所有截图，统计吞吐量"""
+    service = OCRService(args.workers, lang=args.lang)
+    try:
+        if not service.wait_until_ready(timeout=300):
+            return
+        # 等所有工作进程加载完成，并让每个进程先推理一次
+        while service.ready_workers + service.failed_workers < service.workers:
+            time.sleep(0.1)
+        for future in [service.submit(images[0], 0.0, mode) for mode in args.modes for _ in range(args.workers)]:
+            future.result()
+
+        for mode in args.modes:
+            start = time.perf_counter()
+            futures = [service.submit(image, 0.6, mode) for image in images for _ in range(args.repeat)]
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+            print(f"{mode:<8} 工作进程 {service.ready_workers} 个   吞吐量 {len(futures) / elapsed:>6.1f} 张/秒   "
+                  f"平均每张 {elapsed * 1000 / len(futures):>8.1f} ms")
+        stats = service.get_stats()
+        print(f"平均推理 {stats['avg_infer_ms']:.1f} ms，平均往返 {stats['avg_roundtrip_ms']:.1f} ms")
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR识别模式基准测试")
+    parser.add_argument('--source', default='debug_ocr', help="截图目录")
+    parser.add_argument('--region', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'),
+                        help="只识别截图中的该区域，默认整张截图")
+    parser.add_argument('--modes', nargs='+', default=list(OCRManager.MODES), help="要测试的识别模式")
+    parser.add_argument('--repeat', type=int, default=3, help="每张截图重复识别的次数")
+    parser.add_argument('--lang', default='ch', help="OCR语言")
+    parser.add_argument('--workers', type=int, default=0, help="OCR工作进程数量，0表示不测试工作进程池")
+    args = parser.parse_args()
+
+    images = []
+    for name in sorted(os.listdir(args.source)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            image = cv2.imread(os.path.join(args.source, name), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            if args.region:
+                x, y, w, h = args.region
+                image = image[y:y + h, x:x + w]
+            images.append(image)
+    if not images:
+        print("没有找到截图")
+        return
+
+    ocr_manager = OCRManager(None, None, args.lang, background=False)
+    if not ocr_manager.is_ready():
+        return
+    print(f"截图 {len(images)} 张，尺寸 {images[0].shape[1]}x{images[0].shape[0]}，每张重复 {args.repeat} 次")
+
+    # 预热，第一次推理包含模型加载等额外开销
+    for mode in args.modes:
+        ocr_manager._run_ocr(images[0], 0.0, mode)
+
+    for mode in args.modes:
+        timings = []
+        texts = 0
+        for image in images:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = ocr_manager._run_ocr(image, 0.6, mode)
+                timings.append((time.perf_counter() - start) * 1000)
+            texts += len(results)
+        timings = np.array(timings)
+        print(f"{mode:<8} 平均 {timings.mean():>8.1f} ms   中位数 {np.median(timings):>8.1f} ms   "
+              f"P95 {np.percentile(timings, 95):>8.1f} ms   平均识别 {texts / len(images):.1f} 条")
+        print(f"{'':<8} 单进程吞吐量 {1000 / timings.mean():>6.1f} 张/秒")
+
+    if args.workers > 0:
+        bench_workers(images, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多目标匹配峰值提取基准测试
+比较旧的逐像素循环 + groupRectangles 与向量化的非极大值抑制
+
+用法: python benchmarks/bench_peaks.py [--sources screenshots] [--thresholds 0.5 0.7 0.9] [--repeat 10]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.matching import find_peaks
+from utils.tools import get_all_templates
+
+
+def legacy_peaks(result, threshold, w, h):
+    """旧实现：遍历所有超过阈值的像素，再用groupRectangles合并"""
+    locations = np.where(result >= threshold)
+    rectangles = []
+    for point in zip(*locations[::-1]):
+        rectangles.append([point[0], point[1], point[0] + w, point[1] + h])
+    if not rectangles or not hasattr(cv2, 'groupRectangles'):
+        return len(rectangles), rectangles
+    grouped, _ = cv2.groupRectangles(rectangles, 1, 0.5)
+    return len(rectangles), grouped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多目标匹配峰值提取基准测试")
+    parser.add_argument('--sources', nargs='+', default=['screenshots'], help="截图目录")
+    parser.add_argument('--templates', default='resources/templates', help="模板目录")
+    parser.add_argument('--thresholds', nargs='+', type=float, default=[0.3, 0.5, 0.7, 0.9], help="匹配阈值")
+    parser.add_argument('--screens', type=int, default=3, help="每个目录最多使用的截图数量")
+    parser.add_argument('--repeat', type=int, default=10, help="每张得分图重复测量的次数，取平均值")
+    args = parser.parse_args()
+
+    screens = []
+    for source in args.sources:
+        if not os.path.isdir(source):
+            continue
+        names = [n for n in sorted(os.listdir(source)) if n.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        for name in names[:args.screens]:
+            screens.append(cv2.imread(os.path.join(source, name), cv2.IMREAD_COLOR))
+    templates = [cv2.imread(path, cv2.IMREAD_COLOR) for path in get_all_templates(args.templates).values()]
+    if not screens or not templates:
+        print("没有找到截图或模板")
+        return
+    if not hasattr(cv2, 'groupRectangles'):
+        print("当前OpenCV没有groupRectangles，旧实现只统计逐像素循环的耗时")
+
+    # 匹配得分图只计算一次，只比较峰值提取部分
+    results = []
+    for screen in screens:
+        for template in templates:
+            gray_screen = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+            gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+            h, w = gray_template.shape[:2]
+            results.append((cv2.matchTemplate(gray_screen, gray_template, cv2.TM_CCOEFF_NORMED), w, h))
+    print(f"得分图 {len(results)} 张，每张重复 {args.repeat} 次")
+
+    # 预热，避免第一次调用的初始化开销计入结果
+    for result, w, h in results:
+        legacy_peaks(result, args.thresholds[0], w, h)
+        find_peaks(result, args.thresholds[0], (max(1, w // 2), max(1, h // 2)))
+
+    for threshold in args.thresholds:
+        legacy_time = 0.0
+        vector_time = 0.0
+        pixels = 0
+        legacy_count = 0
+        vector_count = 0
+        for result, w, h in results:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                raw, grouped = legacy_peaks(result, threshold, w, h)
+            legacy_time += (time.perf_counter() - start) / args.repeat
+            pixels += raw
+            legacy_count += len(grouped)
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                xs, _, _ = find_peaks(result, threshold, (max(1, w // 2), max(1, h // 2)))
+            vector_time += (time.perf_counter() - start) / args.repeat
+            vector_count += len(xs)
+
+        n = len(results)
+        print(f"阈值 {threshold:.2f}  超过阈值像素 {pixels / n:>9.0f}   "
+              f"旧实现 {legacy_time / n * 1000:>8.2f} ms ({legacy_count / n:.1f} 个)   "
+              f"向量化 {vector_time / n * 1000:>7.2f} ms ({vector_count / n:.1f} 个)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基准测试使用的假win32层
+在没有pywin32的环境（如Linux）下模拟截图用到的GDI接口，
+窗口内容来自一张固定的BGR图像
+"""
+
+import sys
+import types
+import ctypes
+import itertools
+
+import numpy as np
+
+_handles = itertools.count(0x1000)
+_objects = {}
+
+
+def _register(obj):
+    handle = next(_handles)
+    _objects[handle] = obj
+    return handle
+
+
+class FakeBitmap:
+    def __init__(self):
+        self.handle = _register(self)
+        self.bits = None
+
+    def CreateCompatibleBitmap(self, dc, width, height):
+        self.bits = np.zeros((height, width, 4), dtype=np.uint8)
+
+    def GetInfo(self):
+        height, width = self.bits.shape[:2]
+        return {'bmWidth': width, 'bmHeight': height, 'bmBitsPixel': 32}
+
+    def GetBitmapBits(self, as_string):
+        return self.bits.tobytes()
+
+    def GetHandle(self):
+        return self.handle
+
+
+class FakeDC:
+    def __init__(self, screen):
+        self.screen = screen
+        self.selected = None
+        self.handle = _register(self)
+
+    def CreateCompatibleDC(self):
+        return FakeDC(self.screen)
+
+    def SelectObject(self, obj):
+        self.selected = obj
+
+    def BitBlt(self, dest_pos, size, src_dc, src_pos, rop):
+        width, height = size
+        x, y = src_pos
+        self.selected.bits[:height, :width] = src_dc.screen[y:y + height, x:x + width]
+
+    def GetSafeHdc(self):
+        return self.handle
+
+    def DeleteDC(self):
+        _objects.pop(self.handle, None)
+
+
+class FakeGdi32:
+    """模拟 ctypes.windll.gdi32 中的 GetDIBits"""
+
+    def GetDIBits(self, hdc, hbitmap, start, lines, bits_ptr, bmi_ptr, usage):
+        bitmap = _objects[hbitmap]
+        data = bitmap.bits[start:start + lines]
+        ctypes.memmove(bits_ptr, data.ctypes.data, data.nbytes)
+        return lines
+
+
+def install(screen):
+    """
+    安装假win32模块
+    screen: 模拟的窗口内容（BGR图像）
+    返回: 可替换 core.capture._gdi32 的 FakeGdi32 实例
+    """
+    height, width = screen.shape[:2]
+    screen_bgrx = np.zeros((height, width, 4), dtype=np.uint8)
+    screen_bgrx[:, :, :3] = screen
+
+    win32gui = types.ModuleType('win32gui')
+    win32gui.FindWindow = lambda cls, name: 1
+    win32gui.EnumWindows = lambda callback, extra: None
+    win32gui.IsWindow = lambda hwnd: True
+    win32gui.IsWindowVisible = lambda hwnd: True
+    win32gui.IsIconic = lambda hwnd: False
+    win32gui.GetWindowText = lambda hwnd: 'PokeMMO'
+    win32gui.GetWindowRect = lambda hwnd: (0, 0, width, height)
+    win32gui.GetClientRect = lambda hwnd: (0, 0, width, height)
+    win32gui.ClientToScreen = lambda hwnd, point: point
+    win32gui.GetDC = lambda hwnd: _register(screen_bgrx)
+    win32gui.ReleaseDC = lambda hwnd, hdc: _objects.pop(hdc, None)
+    win32gui.DeleteObject = lambda handle: _objects.pop(handle, None)
+
+    win32ui = types.ModuleType('win32ui')
+    win32ui.CreateDCFromHandle = lambda hdc: FakeDC(_objects[hdc])
+    win32ui.CreateBitmap = FakeBitmap
+
+    win32con = types.ModuleType('win32con')
+    win32con.SRCCOPY = 0x00CC0020
+    win32con.SW_RESTORE = 9
+
+    win32api = types.ModuleType('win32api')
+
+    sys.modules.update({
+        'win32gui': win32gui,
+        'win32ui': win32ui,
+        'win32con': win32con,
+        'win32api': win32api,
+    })
+    return FakeGdi32()
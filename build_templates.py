@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板索引构建工具
+将模板目录中的所有模板及其预处理结果打包为一个索引文件，加快启动和首次检测
+修改、添加或删除模板后需要重新运行；索引过期时程序会自动改为从模板目录加载
+
+用法: python build_templates.py [--config config.json] [--output resources/templates.npz]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.templates import TemplateStore
+from utils import load_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建模板索引")
+    parser.add_argument('--config', default='config.json', help="配置文件")
+    parser.add_argument('--output', help="索引文件路径，默认使用配置中的template_store.index_file")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    templates_dir = config.get("templates_dir", "resources/templates")
+    template_config = config.get("template_store", {})
+    output = args.output or template_config.get("index_file") or "resources/templates.npz"
+
+    store = TemplateStore(templates_dir, color_default=template_config.get("color_default", True))
+    start = time.perf_counter()
+    count = store.build_index(output)
+    elapsed = time.perf_counter() - start
+    print(f"已将 {count} 个模板打包到 {output}，耗时 {elapsed:.2f} 秒，"
+          f"文件大小 {os.path.getsize(output) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
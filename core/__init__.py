@@ -1,7 +1,24 @@
 from .window import GameWindow
 from .image import ImageManager
-from .ocr import OCRManager
-from .input import InputManager
-from .alert import AlertManager
+from .ocr import OCRManager, OCRNotReady
+from .templates import TemplateStore
 
-__all__ = ['GameWindow', 'ImageManager', 'OCRManager', 'InputManager', 'AlertManager'] 
\ No newline at end of file
+__all__ = ['GameWindow', 'ImageManager', 'OCRManager', 'OCRNotReady', 'InputManager', 'AlertManager', 'TemplateStore']
+
+
+# 输入和报警依赖pyautogui、keyboard、pygame和pydub，这些库在无显示器的Linux上无法导入，
+# 推迟到第一次使用时再导入，使截图、检测和回放模块在任何平台上都能单独导入
+_LAZY_EXPORTS = {
+    'InputManager': '.input',
+    'AlertManager': '.alert'
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        import importlib
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
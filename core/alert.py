@@ -48,29 +48,45 @@ class AlertManager:
         return False
     
     def _captcha_check_loop(self, callback=None):
-        """验证码检查循环"""
-        while not self.stop_event.is_set():
-            try:
-                # 检查验证码
-                if self.ocr_manager.check_captcha(self.captcha_keywords):
-                    # 播放警报声音
-                    self.play_alert()
+        """验证码检查循环，结束时释放本线程的截图资源"""
+        try:
+            unavailable = False
+            while not self.stop_event.is_set():
+                try:
+                    # 检查验证码，作为后台请求排在任务的识别之后
+                    detected = self.ocr_manager.check_captcha(self.captcha_keywords, priority='background')
                     
-                    # 调用回调函数
-                    if callback:
-                        callback()
+                    # OCR尚未就绪时无法检查，状态变化时提示，不当作"没有验证码"
+                    if detected is None:
+                        if not unavailable:
+                            print("OCR尚未就绪，验证码检查暂停，就绪后自动恢复")
+                        unavailable = True
+                    elif unavailable:
+                        print("OCR已就绪，恢复验证码检查")
+                        unavailable = False
                     
-                    # 停止检查，等待手动处理
-                    break
-            except Exception as e:
-                print(f"验证码检查错误: {e}")
-            
-            # 等待下一次检查
-            # 使用短间隔轮询以便及时响应停止请求
-            for _ in range(int(self.check_interval * 2)):
-                if self.stop_event.is_set():
-                    break
-                time.sleep(0.5)
+                    if detected:
+                        # 播放警报声音
+                        self.play_alert()
+                        
+                        # 调用回调函数
+                        if callback:
+                            callback()
+                        
+                        # 停止检查，等待手动处理
+                        break
+                except Exception as e:
+                    print(f"验证码检查错误: {e}")
+                
+                # 等待下一次检查
+                # 使用短间隔轮询以便及时响应停止请求
+                for _ in range(int(self.check_interval * 2)):
+                    if self.stop_event.is_set():
+                        break
+                    time.sleep(0.5)
+    
+        finally:
+            self.ocr_manager.image_manager.release_thread()
     
     def play_alert(self, sound_file=None, repeat=3):
         """
@@ -0,0 +1,699 @@
+import os
+import time
+import ctypes
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+# pywin32仅在Windows上可用，回放模式不需要它
+try:
+    import win32gui
+    import win32ui
+    import win32con
+except ImportError:
+    win32gui = win32ui = win32con = None
+
+# GetDIBits可以把位图数据直接写入numpy缓冲区，仅在Windows上可用
+try:
+    _gdi32 = ctypes.windll.gdi32
+    _gdi32.GetDIBits.argtypes = [
+        ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_uint,
+        ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint
+    ]
+    _gdi32.GetDIBits.restype = ctypes.c_int
+except AttributeError:
+    _gdi32 = None
+
+DIB_RGB_COLORS = 0
+BI_RGB = 0
+
+# 一次截图得到的整帧画面
+# generation: 递增的帧序号；timestamp: 截图时间（time.perf_counter）
+# max_age: 有效期（秒）；capture_ms: 截图耗时（毫秒）
+Frame = namedtuple('Frame', ['image', 'generation', 'timestamp', 'max_age', 'capture_ms'])
+
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ('biSize', ctypes.c_uint32),
+        ('biWidth', ctypes.c_int32),
+        ('biHeight', ctypes.c_int32),
+        ('biPlanes', ctypes.c_uint16),
+        ('biBitCount', ctypes.c_uint16),
+        ('biCompression', ctypes.c_uint32),
+        ('biSizeImage', ctypes.c_uint32),
+        ('biXPelsPerMeter', ctypes.c_int32),
+        ('biYPelsPerMeter', ctypes.c_int32),
+        ('biClrUsed', ctypes.c_uint32),
+        ('biClrImportant', ctypes.c_uint32),
+    ]
+
+
+class BITMAPINFO(ctypes.Structure):
+    _fields_ = [
+        ('bmiHeader', BITMAPINFOHEADER),
+        ('bmiColors', ctypes.c_uint32 * 3),
+    ]
+
+
+class _PoolEntry:
+    """某一尺寸的GDI对象和复用缓冲区"""
+
+    def __init__(self, mfc_dc, width, height):
+        self.width = width
+        self.height = height
+
+        # 兼容DC和位图只创建一次，之后每帧复用
+        self.save_dc = mfc_dc.CreateCompatibleDC()
+        self.bitmap = win32ui.CreateBitmap()
+        self.bitmap.CreateCompatibleBitmap(mfc_dc, width, height)
+        self.save_dc.SelectObject(self.bitmap)
+
+        # BGRX像素直接写入这个缓冲区
+        self.buffer = np.empty((height, width, 4), dtype=np.uint8)
+
+        # 高度取负值表示自上而下的行顺序，与numpy一致
+        self.bmi = BITMAPINFO()
+        header = self.bmi.bmiHeader
+        header.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        header.biWidth = width
+        header.biHeight = -height
+        header.biPlanes = 1
+        header.biBitCount = 32
+        header.biCompression = BI_RGB
+
+    def release(self):
+        """释放GDI对象"""
+        try:
+            win32gui.DeleteObject(self.bitmap.GetHandle())
+        except Exception:
+            pass
+        try:
+            self.save_dc.DeleteDC()
+        except Exception:
+            pass
+
+
+class GdiCapturePool:
+    def __init__(self, max_entries=8):
+        """
+        复用GDI对象的截图池
+        max_entries: 最多保留的尺寸数量，超出时淘汰最久未使用的尺寸
+        """
+        self.max_entries = max_entries
+        self._hwnd = None
+        self._hwnd_dc = None
+        self._mfc_dc = None
+        self._entries = OrderedDict()  # (width, height) -> _PoolEntry
+
+        # 统计信息
+        self.frames = 0
+        self.entries_created = 0
+
+    def _acquire(self, hwnd):
+        """获取窗口设备上下文"""
+        self._hwnd_dc = win32gui.GetDC(hwnd)
+        self._mfc_dc = win32ui.CreateDCFromHandle(self._hwnd_dc)
+        self._hwnd = hwnd
+
+    def _get_entry(self, width, height):
+        """获取指定尺寸的缓存对象，不存在时创建"""
+        key = (width, height)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        entry = _PoolEntry(self._mfc_dc, width, height)
+        self._entries[key] = entry
+        self.entries_created += 1
+
+        # 淘汰最久未使用的尺寸
+        while len(self._entries) > self.max_entries:
+            _, old_entry = self._entries.popitem(last=False)
+            old_entry.release()
+        return entry
+
+    def _read_bits(self, entry):
+        """将位图数据读入复用缓冲区"""
+        if _gdi32 is not None:
+            lines = _gdi32.GetDIBits(
+                entry.save_dc.GetSafeHdc(), entry.bitmap.GetHandle(),
+                0, entry.height, entry.buffer.ctypes.data,
+                ctypes.addressof(entry.bmi), DIB_RGB_COLORS)
+            if lines != entry.height:
+                raise RuntimeError(f"GetDIBits失败，仅读取了 {lines}/{entry.height} 行")
+        else:
+            # 没有GetDIBits时退回GetBitmapBits，仍然复用目标缓冲区
+            bits = entry.bitmap.GetBitmapBits(True)
+            entry.buffer.reshape(-1)[:] = np.frombuffer(bits, dtype=np.uint8)
+
+    def grab(self, hwnd, x, y, width, height):
+        """
+        截取窗口客户区的指定区域
+        返回: BGR图像，是复用缓冲区的视图，同尺寸的下一次截图会覆盖其内容
+        """
+        if hwnd != self._hwnd or self._mfc_dc is None:
+            self.release()
+            self._acquire(hwnd)
+
+        entry = self._get_entry(width, height)
+        try:
+            entry.save_dc.BitBlt((0, 0), (width, height), self._mfc_dc, (x, y), win32con.SRCCOPY)
+            self._read_bits(entry)
+        except Exception:
+            # 窗口DC可能已失效，全部释放后由下一次调用重新创建
+            self.release()
+            raise
+
+        self.frames += 1
+        return entry.buffer[:, :, :3]
+
+    def release(self):
+        """释放所有GDI对象"""
+        for entry in self._entries.values():
+            entry.release()
+        self._entries.clear()
+
+        if self._mfc_dc is not None:
+            try:
+                self._mfc_dc.DeleteDC()
+            except Exception:
+                pass
+        if self._hwnd_dc is not None:
+            try:
+                win32gui.ReleaseDC(self._hwnd, self._hwnd_dc)
+            except Exception:
+                pass
+
+        self._hwnd = None
+        self._hwnd_dc = None
+        self._mfc_dc = None
+
+
+def region_key(region):
+    """将区域转换为可哈希的元组，用作缓存键"""
+    return tuple(region) if region else None
+
+
+def clamp_region(region, width, height):
+    """
+    将区域限制在画面范围内
+    region: (x, y, width, height)，None表示整个画面
+    返回: 限制后的 (x, y, w, h)
+    """
+    if not region:
+        return 0, 0, width, height
+
+    x, y, w, h = region
+    x = max(0, min(x, width))
+    y = max(0, min(y, height))
+    w = max(1, min(w, width - x))
+    h = max(1, min(h, height - y))
+    return x, y, w, h
+
+
+class FrameSource:
+    """
+    画面来源接口
+    capture(region) 返回BGR图像，get_size() 返回画面尺寸 (width, height)
+    """
+
+    def capture(self, region=None):
+        raise NotImplementedError
+
+    def get_size(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def release_thread(self):
+        """释放当前线程占用的资源，截图线程结束前调用"""
+        pass
+
+
+class GdiFrameSource(FrameSource):
+    def __init__(self, game_window):
+        """
+        通过GDI BitBlt截取游戏窗口
+        game_window: GameWindow实例
+        """
+        if win32gui is None:
+            raise RuntimeError("未安装pywin32，无法使用GDI截图，请改用ReplayFrameSource")
+
+        self.game_window = game_window
+
+        # 每个线程持有独立的截图池，避免不同线程覆盖同一个复用缓冲区
+        self._local = threading.local()
+        self._pools = []  # (所属线程, 截图池)
+        self._pools_lock = threading.Lock()
+
+    def _get_pool(self):
+        """获取当前线程的截图池，创建时顺便释放已结束线程留下的截图池"""
+        pool = getattr(self._local, 'pool', None)
+        if pool is None:
+            pool = GdiCapturePool()
+            self._local.pool = pool
+            with self._pools_lock:
+                dead = [item for item in self._pools if not item[0].is_alive()]
+                self._pools = [item for item in self._pools if item[0].is_alive()]
+                self._pools.append((threading.current_thread(), pool))
+            for _, dead_pool in dead:
+                dead_pool.release()
+        return pool
+
+    def release_thread(self):
+        """释放当前线程的截图池（窗口DC和位图）"""
+        pool = getattr(self._local, 'pool', None)
+        if pool is None:
+            return
+        self._local.pool = None
+        with self._pools_lock:
+            self._pools = [item for item in self._pools if item[1] is not pool]
+        pool.release()
+
+    def get_size(self):
+        client_rect = self.game_window.get_client_rect()
+        return client_rect['width'], client_rect['height']
+
+    def capture(self, region=None):
+        """
+        截取游戏窗口客户区
+        返回: BGR图像，是复用缓冲区的视图，当前线程下一次同尺寸截图会覆盖其内容
+        """
+        hwnd = self.game_window.hwnd
+        if not hwnd:
+            self.game_window.find_window()
+            hwnd = self.game_window.hwnd
+
+        width, height = self.get_size()
+        x, y, w, h = clamp_region(region, width, height)
+        return self._get_pool().grab(hwnd, x, y, w, h)
+
+    def close(self):
+        """释放所有线程的GDI资源"""
+        with self._pools_lock:
+            pools = self._pools
+            self._pools = []
+        for _, pool in pools:
+            pool.release()
+
+
+class ReplayFrameSource(FrameSource):
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, path, fps=None, loop=True, manual=False, preload=False):
+        """
+        回放录制的画面，用于脱离游戏运行和测试检测流程
+        path: 图片目录（按文件名排序）或视频文件
+        fps: 回放帧率，None表示不限速，每次capture前进一帧
+        loop: 播放到结尾后是否从头开始
+        manual: 为True时只在调用next_frame()时切换画面
+        preload: 是否预先解码目录中的所有图片（视频不支持）
+        """
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.manual = manual
+        self.finished = False
+
+        self._lock = threading.Lock()
+        self._files = None
+        self._frames = None
+        self._video = None
+        self._index = -1
+        self._frame = None
+        self._delivered = False
+        self._start_time = None
+        self.frames_read = 0
+
+        if os.path.isdir(path):
+            self._files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(self.IMAGE_EXTENSIONS))
+            if not self._files:
+                raise FileNotFoundError(f"目录中没有图片: {path}")
+            if preload:
+                self._frames = [self._read_image(file) for file in self._files]
+        else:
+            self._video = cv2.VideoCapture(path)
+            if not self._video.isOpened():
+                raise FileNotFoundError(f"无法打开视频: {path}")
+
+        # 先读入第一帧，以便get_size()可用
+        self._seek(0)
+        if self._frame is None:
+            raise FileNotFoundError(f"无法读取第一帧: {path}")
+
+    @staticmethod
+    def _read_image(file):
+        image = cv2.imread(file, cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(f"无法读取图片: {file}")
+        return image
+
+    def _frame_count(self):
+        if self._files is not None:
+            return len(self._files)
+        return int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def _seek(self, index):
+        """切换到指定帧"""
+        if self._files is not None:
+            count = len(self._files)
+            if index >= count:
+                if not self.loop:
+                    self.finished = True
+                    return
+                index %= count
+            if self._frames is not None:
+                self._frame = self._frames[index]
+            else:
+                self._frame = self._read_image(self._files[index])
+            self._index = index
+            self.frames_read += 1
+            return
+
+        # 视频只能顺序读取，跳帧时丢弃中间的帧
+        if index < self._index:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._index = -1
+        frame = None
+        while self._index < index:
+            ok, frame = self._video.read()
+            if not ok:
+                if not self.loop or self._index < 0:
+                    self.finished = True
+                    return
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self._index = -1
+                index = 0
+                continue
+            self._index += 1
+        if frame is not None:
+            self._frame = frame
+            self.frames_read += 1
+
+    def next_frame(self):
+        """前进一帧，返回是否还有新画面"""
+        with self._lock:
+            self._seek(self._index + 1)
+            self._delivered = False
+            return not self.finished
+
+    def _advance(self):
+        """根据回放模式更新当前帧"""
+        if self.manual or self.finished:
+            return
+        if self.fps is None:
+            # 第一次调用返回已读入的第一帧
+            if self._delivered:
+                self._seek(self._index + 1)
+            self._delivered = True
+            return
+
+        # 按实际经过的时间计算应显示的帧
+        now = time.perf_counter()
+        if self._start_time is None:
+            self._start_time = now
+        target = int((now - self._start_time) * self.fps)
+        count = self._frame_count()
+        if self.loop and count > 0:
+            target %= count
+        if target != self._index:
+            self._seek(target)
+
+    def get_size(self):
+        height, width = self._frame.shape[:2]
+        return width, height
+
+    def capture(self, region=None):
+        """返回当前回放帧的指定区域"""
+        with self._lock:
+            self._advance()
+            frame = self._frame
+
+        height, width = frame.shape[:2]
+        x, y, w, h = clamp_region(region, width, height)
+        return frame[y:y + h, x:x + w]
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+
+class CaptureThread:
+    def __init__(self, frame_source, fps=20, buffer_size=3, stale_after=None, generations=None):
+        """
+        后台截图线程，按目标帧率截图并发布最新帧
+        frame_source: 画面来源
+        fps: 目标帧率
+        buffer_size: 环形缓冲区的槽位数量，最新帧至少在buffer_size-1个周期内不会被覆盖
+        stale_after: 读取到的帧超过该时间（秒）视为过期，None表示两个截图周期
+        generations: 帧序号生成器，与其他截图路径共用以保证序号递增
+        """
+        self.frame_source = frame_source
+        self.fps = fps
+        self.buffer_size = max(2, buffer_size)
+        self.interval = 1.0 / fps
+        self.stale_after = stale_after if stale_after is not None else self.interval * 2
+
+        self.thread = None
+        self.stop_event = threading.Event()
+        self._condition = threading.Condition()
+        self._slots = []
+        self._slot_index = 0
+        self._latest = None
+        self._latest_read = True
+        self._generations = generations if generations is not None else itertools.count(1)
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self.frames = 0
+        self.dropped = 0
+        self.reads = 0
+        self.stale_reads = 0
+        self.overruns = 0
+        self.errors = 0
+        self._capture_time_total = 0.0
+        self._capture_time_max = 0.0
+        self._start_time = None
+
+    def start(self):
+        """启动截图线程"""
+        if self.thread and self.thread.is_alive():
+            return False
+
+        self.stop_event.clear()
+        self._start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self._capture_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """停止截图线程"""
+        if self.thread and self.thread.is_alive():
+            self.stop_event.set()
+            self.thread.join(timeout=1.0)
+            with self._condition:
+                self._condition.notify_all()
+            return True
+        return False
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _next_slot(self, image):
+        """取出下一个环形缓冲区槽位，尺寸变化时重新分配"""
+        if not self._slots or self._slots[0].shape != image.shape:
+            self._slots = [np.empty(image.shape, dtype=image.dtype) for _ in range(self.buffer_size)]
+            self._slot_index = 0
+        slot = self._slots[self._slot_index]
+        self._slot_index = (self._slot_index + 1) % self.buffer_size
+        return slot
+
+    def _capture_loop(self):
+        """截图循环，结束时释放本线程的截图资源"""
+        try:
+            next_time = time.perf_counter()
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                try:
+                    image = self.frame_source.capture(None)
+                    slot = self._next_slot(image)
+                    np.copyto(slot, image)
+                except Exception as e:
+                    print(f"后台截图失败: {e}")
+                    with self._stats_lock:
+                        self.errors += 1
+                    if self.stop_event.wait(self.interval):
+                        break
+                    next_time = time.perf_counter()
+                    continue
+
+                capture_time = time.perf_counter() - start
+                frame = Frame(
+                    image=slot,
+                    generation=next(self._generations),
+                    timestamp=start,
+                    max_age=self.stale_after,
+                    capture_ms=capture_time * 1000
+                )
+
+                # 发布最新帧，上一帧未被读取过则计为丢帧
+                with self._condition:
+                    if not self._latest_read:
+                        self.dropped += 1
+                    self._latest = frame
+                    self._latest_read = False
+                    self._condition.notify_all()
+
+                with self._stats_lock:
+                    self.frames += 1
+                    self._capture_time_total += capture_time
+                    self._capture_time_max = max(self._capture_time_max, capture_time)
+
+                # 按目标帧率等待，落后时直接开始下一帧
+                next_time += self.interval
+                delay = next_time - time.perf_counter()
+                if delay < 0:
+                    self.overruns += 1
+                    next_time = time.perf_counter()
+                    delay = 0
+                if self.stop_event.wait(delay):
+                    break
+        finally:
+            self.frame_source.release_thread()
+
+    def _mark_read(self, frame):
+        """记录一次读取"""
+        self._latest_read = True
+        stale = time.perf_counter() - frame.timestamp > self.stale_after
+        with self._stats_lock:
+            self.reads += 1
+            if stale:
+                self.stale_reads += 1
+
+    def get_latest(self):
+        """
+        非阻塞地获取最新帧
+        返回: Frame 或 None（还没有截取到任何帧）
+        注意: Frame.image是环形缓冲区的槽位，需要在buffer_size-1个截图周期内用完或复制
+        """
+        with self._condition:
+            frame = self._latest
+            if frame is not None:
+                self._mark_read(frame)
+            return frame
+
+    def wait_for_frame(self, after_generation=0, timeout=1.0):
+        """
+        等待比指定序号更新的帧
+        after_generation: 已有帧的序号
+        timeout: 最长等待时间（秒）
+        返回: Frame 或 None（超时）
+        """
+        deadline = time.perf_counter() + timeout
+        with self._condition:
+            while self._latest is None or self._latest.generation <= after_generation:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.is_running():
+                    return None
+                self._condition.wait(remaining)
+            frame = self._latest
+            self._mark_read(frame)
+            return frame
+
+    def get_stats(self):
+        """获取截图线程统计信息"""
+        with self._stats_lock:
+            frames = self.frames
+            elapsed = time.perf_counter() - self._start_time if self._start_time else 0.0
+            return {
+                'frames': frames,
+                'fps': frames / elapsed if elapsed > 0 else 0.0,
+                'dropped': self.dropped,
+                'reads': self.reads,
+                'stale_reads': self.stale_reads,
+                'overruns': self.overruns,
+                'errors': self.errors,
+                'avg_capture_ms': self._capture_time_total * 1000 / frames if frames else 0.0,
+                'max_capture_ms': self._capture_time_max * 1000
+            }
+
+
+def _box_area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _box_union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class CapturePlanner:
+    def __init__(self, blit_overhead=4096):
+        """
+        截图区域规划器，将多个小区域合并为尽量少且小的矩形
+        blit_overhead: 每次BitBlt的固定开销，折算成像素数
+        """
+        self.blit_overhead = blit_overhead
+
+    def plan(self, regions):
+        """
+        计算需要截取的矩形
+        regions: 已限制在画面内的区域列表 [(x, y, w, h), ...]
+        返回: 合并后的矩形列表 [(x, y, w, h), ...]
+        """
+        boxes = [(x, y, x + w, y + h) for x, y, w, h in set(regions)]
+
+        # 每次合并节省最多的一对矩形，直到合并不再划算
+        while len(boxes) > 1:
+            best = None
+            for i in range(len(boxes)):
+                for j in range(i + 1, len(boxes)):
+                    union = _box_union(boxes[i], boxes[j])
+                    saving = _box_area(boxes[i]) + _box_area(boxes[j]) + self.blit_overhead - _box_area(union)
+                    if saving > 0 and (best is None or saving > best[0]):
+                        best = (saving, i, j, union)
+            if best is None:
+                break
+            _, i, j, union = best
+            boxes = [box for k, box in enumerate(boxes) if k != i and k != j]
+            boxes.append(union)
+
+        return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in boxes]
+
+
+class CapturePlan:
+    def __init__(self, rects, images, size, timestamp, max_age):
+        """
+        一次规划截图的结果
+        rects: 截取的矩形列表
+        images: 与rects对应的图像
+        size: 画面尺寸 (width, height)
+        """
+        self.rects = rects
+        self.images = images
+        self.size = size
+        self.timestamp = timestamp
+        self.max_age = max_age
+
+    def is_valid(self, now):
+        return now - self.timestamp <= self.max_age
+
+    def crop(self, region):
+        """
+        从已截取的矩形中裁剪区域
+        返回: 图像视图，区域不在任何矩形内时返回None
+        """
+        x, y, w, h = clamp_region(region, *self.size)
+        for (rx, ry, rw, rh), image in zip(self.rects, self.images):
+            if rx <= x and ry <= y and x + w <= rx + rw and y + h <= ry + rh:
+                return image[y - ry:y - ry + h, x - rx:x - rx + w]
+        return None
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+
+
+class FrameChangeGate:
+    def __init__(self, threshold=8, size=(64, 64), max_keys=256):
+        """
+        画面变化门控：区域画面与上次计算时相比没有变化时，直接复用上次的检测结果
+        threshold: 缩略图像素最大绝对差阈值（0-255），低于该值认为画面未变化
+        size: 缩略图尺寸 (width, height)
+        max_keys: 最多保存的检测结果数量
+        """
+        self.threshold = threshold
+        self.size = size
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> (缩略图, 检测结果)
+        self._lock = threading.Lock()
+
+        # 统计信息，按检测器名称（key的第一个元素）分组
+        self._checks = {}
+        self._skips = {}
+
+    def _thumbnail(self, image):
+        """缩小画面，使用区域平均抵消噪点"""
+        width, height = self.size
+        width = min(width, image.shape[1])
+        height = min(height, image.shape[0])
+        return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+    def is_unchanged(self, reference, thumbnail):
+        """
+        比较两张缩略图
+        使用最大差值而不是平均差值，避免小目标（如感叹号）在大区域中被平均掉
+        """
+        if reference.shape != thumbnail.shape:
+            return False
+        diff = cv2.absdiff(reference, thumbnail)
+        return int(diff.max()) < self.threshold
+
+    def run(self, key, image, compute):
+        """
+        画面未变化时返回上次结果，否则调用compute()重新检测
+        key: 检测器及其参数组成的可哈希键，第一个元素为检测器名称
+        image: 检测用的区域画面
+        compute: 无参数的检测函数
+        """
+        thumbnail = self._thumbnail(image)
+        name = key[0]
+
+        with self._lock:
+            self._checks[name] = self._checks.get(name, 0) + 1
+            entry = self._entries.get(key)
+            if entry is not None and self.is_unchanged(entry[0], thumbnail):
+                self._entries.move_to_end(key)
+                self._skips[name] = self._skips.get(name, 0) + 1
+                return entry[1]
+
+        result = compute()
+
+        # 只在重新检测后更新参考画面，缓慢的累积变化最终也会触发检测
+        with self._lock:
+            self._entries[key] = (thumbnail, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return result
+
+    def reset(self):
+        """清空保存的检测结果"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """获取跳过统计，返回 {检测器名称: {'checks', 'skips', 'skip_rate'}}"""
+        with self._lock:
+            stats = {}
+            for name, checks in self._checks.items():
+                skips = self._skips.get(name, 0)
+                stats[name] = {
+                    'checks': checks,
+                    'skips': skips,
+                    'skip_rate': skips / checks if checks else 0.0
+                }
+            return stats
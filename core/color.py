@@ -0,0 +1,201 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+
+# 颜色区域：中心点、外接矩形和像素面积，坐标为屏幕坐标
+ColorBlob = namedtuple('ColorBlob', ['center_x', 'center_y', 'x', 'y', 'width', 'height', 'area'])
+
+
+def color_bounds(target_color, tolerance):
+    """
+    RGB颜色及容差转换为cv2.inRange使用的BGR上下界
+    返回: (lower, upper)
+    """
+    target_bgr = (target_color[2], target_color[1], target_color[0])
+    lower = np.array([max(0, c - tolerance) for c in target_bgr], dtype=np.uint8)
+    upper = np.array([min(255, c + tolerance) for c in target_bgr], dtype=np.uint8)
+    return lower, upper
+
+
+def find_blobs(mask, min_area=1, max_area=None, offset=(0, 0), connectivity=8):
+    """
+    将掩码中的连通区域提取为颜色区域
+    mask: 8位单通道掩码，非零为匹配像素
+    min_area, max_area: 保留的区域面积范围（像素），max_area为None表示不限制
+    offset: 加到坐标上的偏移 (x, y)，用于转换为屏幕坐标
+    返回: [ColorBlob, ...]，按面积从大到小排列
+    """
+    count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=connectivity)
+    # 第0个连通区域是背景
+    stats = stats[1:]
+    centroids = centroids[1:]
+
+    areas = stats[:, cv2.CC_STAT_AREA]
+    keep = areas >= min_area
+    if max_area is not None:
+        keep &= areas <= max_area
+    stats = stats[keep]
+    centroids = centroids[keep]
+    order = np.argsort(-stats[:, cv2.CC_STAT_AREA], kind='stable')
+
+    ox, oy = offset
+    blobs = []
+    for i in order.tolist():
+        x, y, width, height, area = stats[i].tolist()
+        cx, cy = centroids[i]
+        blobs.append(ColorBlob(int(round(cx)) + ox, int(round(cy)) + oy, x + ox, y + oy, width, height, area))
+    return blobs
+
+
+def probe_color(screen, lower, upper, stride=4, min_hits=1, band=64):
+    """
+    快速判断画面中是否有指定颜色：只检查每隔stride个像素的采样点，按横条逐条检查，命中数量足够时立即停止
+    比stride更细的颜色区域可能漏检
+    screen: BGR画面
+    lower, upper: color_bounds返回的上下界
+    stride: 采样间隔（像素）
+    min_hits: 至少需要命中的采样点数量
+    band: 每个横条的高度（像素）
+    返回: 第一个命中采样点附近第一个匹配像素的坐标 (x, y)，没有找到时返回None
+    """
+    stride = max(1, int(stride))
+    height, width = screen.shape[:2]
+    sampled_width = max(1, width // stride)
+    band = max(band, stride)
+
+    hits = 0
+    first = None
+    for y0 in range(0, height, band):
+        # 行按切片间隔取样（不复制），列用最近邻缩小取样，比numpy的列切片复制快得多
+        rows = screen[y0:y0 + band:stride]
+        sampled = cv2.resize(rows, (sampled_width, rows.shape[0]), interpolation=cv2.INTER_NEAREST)
+        mask = cv2.inRange(sampled, lower, upper)
+        count = cv2.countNonZero(mask)
+        if count == 0:
+            continue
+        if first is None:
+            py, px = np.unravel_index(mask.argmax(), mask.shape)
+            first = (y0 + py * stride, px * width // sampled_width)
+        hits += count
+        if hits >= min_hits:
+            break
+    if first is None or hits < min_hits:
+        return None
+
+    # 在命中的采样点附近按全分辨率查找第一个匹配像素
+    y, x = first
+    x0 = max(0, x - stride + 1)
+    y0 = max(0, y - stride + 1)
+    window = cv2.inRange(screen[y0:y + stride, x0:x + stride], lower, upper)
+    wy, wx = np.unravel_index(window.argmax(), window.shape)
+    return int(x0 + wx), int(y0 + wy)
+
+
+def palette_key(colors, space):
+    """调色板定义转换为可哈希的键"""
+    return (space,) + tuple(
+        (name, tuple(color), tolerance if np.isscalar(tolerance) else tuple(tolerance))
+        for name, (color, tolerance) in colors.items())
+
+
+class ColorPalette:
+    def __init__(self, colors, space='rgb'):
+        """
+        多颜色调色板：把多个颜色范围编译为每个通道一张查找表，一次遍历即可标记所有颜色
+        colors: {名称: (颜色, 容差)}，颜色为 (R, G, B) 或 (H, S, V)，容差为整数或每个通道一个值的元组
+        space: 'rgb' 或 'hsv'；HSV使用OpenCV的取值范围（H为0-179，S和V为0-255），色相容差跨越0度时自动回绕
+        最多支持16种颜色
+        """
+        if space not in ('rgb', 'hsv'):
+            raise ValueError(f"不支持的颜色空间: {space}")
+        if not colors:
+            raise ValueError("调色板中至少需要一种颜色")
+        if len(colors) > 16:
+            raise ValueError("调色板最多支持16种颜色")
+
+        self.space = space
+        self.names = list(colors.keys())
+        self.dtype = np.uint8 if len(self.names) <= 8 else np.uint16
+        self.bits = {name: 1 << i for i, name in enumerate(self.names)}
+        self.key = palette_key(colors, space)
+
+        # 每个通道一张查找表，值为该通道取值落在范围内的颜色位掩码
+        lut = np.zeros((1, 256, 3), dtype=self.dtype)
+        values = np.arange(256)
+        for name, (color, tolerance) in colors.items():
+            tolerances = (tolerance,) * 3 if np.isscalar(tolerance) else tuple(tolerance)
+            if space == 'rgb':
+                # 图像为BGR顺序
+                channels = ((color[2], tolerances[2]), (color[1], tolerances[1]), (color[0], tolerances[0]))
+            else:
+                channels = tuple(zip(color, tolerances))
+            for c, (center, tol) in enumerate(channels):
+                if space == 'hsv' and c == 0:
+                    distance = np.abs(values - center) % 180
+                    inside = np.minimum(distance, 180 - distance) <= tol
+                    inside &= values < 180
+                else:
+                    inside = np.abs(values - center) <= tol
+                lut[0, inside, c] |= self.bits[name]
+        self.lut = lut
+
+    def label(self, screen):
+        """
+        标记画面中每个像素匹配的颜色
+        返回: 与画面同尺寸的位掩码图像，第i位表示匹配第i种颜色
+        """
+        if self.space == 'hsv':
+            screen = cv2.cvtColor(screen, cv2.COLOR_BGR2HSV)
+        planes = cv2.split(cv2.LUT(screen, self.lut))
+        return cv2.bitwise_and(cv2.bitwise_and(planes[0], planes[1]), planes[2])
+
+
+class PaletteResult:
+    def __init__(self, palette, labels, offset=(0, 0)):
+        """
+        调色板在一帧画面上的标记结果
+        labels: ColorPalette.label返回的位掩码图像
+        offset: 区域左上角在屏幕上的坐标 (x, y)
+        """
+        self.palette = palette
+        self.labels = labels
+        self.offset = offset
+        self._counts = None
+
+    def mask(self, name):
+        """指定颜色的8位掩码，匹配像素为255"""
+        bit = self.palette.bits[name]
+        return np.where(self.labels & bit, 255, 0).astype(np.uint8)
+
+    def counts(self):
+        """所有颜色的匹配像素数量 {名称: 数量}，用一次直方图统计得到"""
+        if self._counts is None:
+            histogram = np.bincount(self.labels.ravel(), minlength=1 << len(self.palette.names))
+            values = np.arange(len(histogram))
+            self._counts = {
+                name: int(histogram[(values & bit) != 0].sum())
+                for name, bit in self.palette.bits.items()
+            }
+        return self._counts
+
+    def count(self, name):
+        """指定颜色的匹配像素数量"""
+        return self.counts()[name]
+
+    def found(self, name, min_count=1):
+        """指定颜色是否至少有min_count个像素"""
+        return self.count(name) >= min_count
+
+    def position(self, name):
+        """指定颜色的第一个匹配点（屏幕坐标），没有时返回None"""
+        mask = self.labels & self.palette.bits[name]
+        if not mask.any():
+            return None
+        y, x = np.unravel_index(mask.argmax(), mask.shape)
+        return int(x) + self.offset[0], int(y) + self.offset[1]
+
+    def blobs(self, name, min_area=1, max_area=None):
+        """指定颜色的连通区域 [ColorBlob, ...]"""
+        return find_blobs(self.mask(name), min_area, max_area, self.offset)
@@ -0,0 +1,228 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+import cv2
+
+
+class DebugSink:
+    def __init__(self, directory="debug_images", enabled=True, queue_size=16, min_interval=1.0,
+                 sample_every=1, codec=".png", compression=3, quality=90, max_dir_mb=100):
+        """
+        调试截图保存器：在后台线程中编码和写入图像，不阻塞检测线程
+        directory: 保存目录
+        enabled: 是否启用
+        queue_size: 等待写入的最大图像数量，队列满时丢弃新图像
+        min_interval: 同一标签两次保存之间的最小间隔（秒）
+        sample_every: 同一标签每提交N次保存一次
+        codec: 图像格式，'.png'、'.jpg' 或 '.webp'
+        compression: PNG压缩级别（0-9），越低编码越快
+        quality: JPG/WEBP质量（0-100）
+        max_dir_mb: 目录大小上限（MB），超出时删除最早的图像
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.min_interval = min_interval
+        self.sample_every = max(1, sample_every)
+        self.codec = codec if codec.startswith('.') else '.' + codec
+        self.max_bytes = int(max_dir_mb * 1024 * 1024)
+
+        if self.codec == '.png':
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+        elif self.codec in ('.jpg', '.jpeg'):
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        elif self.codec == '.webp':
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+        else:
+            self.params = []
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._sequence = 0
+        self._last_saved = {}  # 标签 -> 上次保存时间
+        self._submit_counts = {}  # 标签 -> 提交次数
+        self._files = deque()  # (路径, 大小)
+        self._total_bytes = 0
+
+        # 统计信息
+        self.submitted = 0
+        self.accepted = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.written = 0
+        self.deleted = 0
+        self.errors = 0
+        self._write_time_total = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        """根据配置文件的debug部分创建"""
+        debug_config = config.get("debug", {})
+        return cls(
+            directory=debug_config.get("directory", "debug_images"),
+            enabled=debug_config.get("save_screenshots", False),
+            queue_size=debug_config.get("queue_size", 16),
+            min_interval=debug_config.get("min_interval", 1.0),
+            sample_every=debug_config.get("sample_every", 1),
+            codec=debug_config.get("codec", ".png"),
+            compression=debug_config.get("compression", 3),
+            quality=debug_config.get("quality", 90),
+            max_dir_mb=debug_config.get("max_dir_mb", 100)
+        )
+
+    def submit(self, image, tag="debug"):
+        """
+        提交一张图像，立即返回
+        image: BGR图像
+        tag: 标签，用于文件名和限速
+        返回: 是否进入写入队列
+        """
+        if not self.enabled or image is None:
+            return False
+
+        now = time.perf_counter()
+        with self._lock:
+            self.submitted += 1
+
+            # 采样和限速
+            count = self._submit_counts.get(tag, 0) + 1
+            self._submit_counts[tag] = count
+            last = self._last_saved.get(tag)
+            if (count - 1) % self.sample_every != 0 or \
+               (last is not None and now - last < self.min_interval):
+                self.rate_limited += 1
+                return False
+
+            self._sequence += 1
+            sequence = self._sequence
+
+        # 截图可能是复用缓冲区的视图，入队前复制
+        try:
+            self._queue.put_nowait((tag, sequence, time.time(), image.copy()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self._last_saved[tag] = now
+            self.accepted += 1
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        """按需启动写入线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            self._scan_directory()
+            self._thread = threading.Thread(target=self._write_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _scan_directory(self):
+        """统计目录中已有的调试图像，按修改时间排序"""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((os.path.getmtime(path), path, os.path.getsize(path)))
+                except OSError:
+                    pass
+        files.sort()
+        self._files = deque((path, size) for _, path, size in files)
+        self._total_bytes = sum(size for _, size in self._files)
+
+    def _write_loop(self):
+        """写入循环"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+
+            tag, sequence, timestamp, image = item
+            try:
+                self._write(tag, sequence, timestamp, image)
+            except Exception as e:
+                print(f"保存调试图像失败: {e}")
+                with self._lock:
+                    self.errors += 1
+            finally:
+                self._queue.task_done()
+
+    def _write(self, tag, sequence, timestamp, image):
+        """编码并写入一张图像，然后清理超出上限的旧图像"""
+        start = time.perf_counter()
+
+        # 文件名包含毫秒和序号，避免同一秒内的文件互相覆盖
+        millis = int((timestamp % 1) * 1000)
+        filename = f"{tag}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(timestamp))}_{millis:03d}_{sequence:06d}{self.codec}"
+        path = os.path.join(self.directory, filename)
+        ok, data = cv2.imencode(self.codec, image, self.params)
+        if not ok:
+            raise RuntimeError(f"编码失败: {filename}")
+        with open(path, 'wb') as f:
+            f.write(data.tobytes())
+
+        with self._lock:
+            self._files.append((path, len(data)))
+            self._total_bytes += len(data)
+            self.written += 1
+            self._write_time_total += time.perf_counter() - start
+
+            # 保留最新的一张，删除最早的图像直到低于上限
+            while self._total_bytes > self.max_bytes and len(self._files) > 1:
+                old_path, old_size = self._files.popleft()
+                self._total_bytes -= old_size
+                try:
+                    os.remove(old_path)
+                    self.deleted += 1
+                except OSError:
+                    pass
+
+    def flush(self, timeout=None):
+        """等待队列中的图像写完"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        if timeout is None:
+            self._queue.join()
+            return
+        deadline = time.perf_counter() + timeout
+        while self._queue.unfinished_tasks and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout=2.0):
+        """写完剩余图像后停止写入线程"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout=timeout)
+
+    def get_stats(self):
+        """获取统计信息"""
+        with self._lock:
+            written = self.written
+            return {
+                'submitted': self.submitted,
+                'accepted': self.accepted,
+                'rate_limited': self.rate_limited,
+                'dropped': self.dropped,
+                'written': written,
+                'deleted': self.deleted,
+                'errors': self.errors,
+                'queued': self._queue.qsize(),
+                'avg_write_ms': self._write_time_total * 1000 / written if written else 0.0,
+                'dir_bytes': self._total_bytes
+            }
@@ -1,131 +1,566 @@
 import cv2
 import numpy as np
-import win32gui
-import win32ui
-import win32con
 import random
 import time
-from PIL import Image
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .change import FrameChangeGate
+from .tracking import LocationTracker
+from .scaling import ScaleCache
+from .color import color_bounds, find_blobs, probe_color, palette_key, ColorPalette, PaletteResult
+from .templates import TemplateStore
+from .matching import match_exact, match_pyramid, match_all, convert_channel, select_method
+from .capture import (GdiFrameSource, CaptureThread, CapturePlanner, CapturePlan,
+                      Frame, clamp_region, region_key)
 
 class ImageManager:
-    def __init__(self, game_window):
+    def __init__(self, game_window, frame_source=None, frame_max_age=0.05, template_store=None):
+        """
+        初始化图像管理器
+        game_window: GameWindow实例，回放模式下可以为None
+        frame_source: 画面来源，None表示通过GDI截取游戏窗口
+        frame_max_age: 缓存帧的默认有效期（秒），在有效期内各检测器共用同一帧，0表示不缓存
+        template_store: 模板缓存，None表示创建一个只按路径查找的缓存
+        """
         self.game_window = game_window
+        if frame_source is None:
+            frame_source = GdiFrameSource(game_window)
+        self.frame_source = frame_source
+        self.template_store = template_store if template_store is not None else TemplateStore()
+        
+        # 帧缓存按线程保存，避免其他线程截图时覆盖正在使用的复用缓冲区
+        self.frame_max_age = frame_max_age
+        self._frame_local = threading.local()
+        self._generations = itertools.count(1)
+        self._frame_stats_lock = threading.Lock()
+        self._frame_hits = 0
+        self._frame_misses = 0
+        self._capture_time_total = 0.0
+        
+        # 可选的后台截图线程
+        self.capture_thread = None
+        
+        # 按轮次规划截图区域，只截取本轮检测器需要的矩形
+        self.capture_planner = CapturePlanner()
+        self._plan_stats_lock = threading.Lock()
+        self._plan_ticks = 0
+        self._plan_blits = 0
+        self._plan_pixels = 0
+        self._plan_full_pixels = 0
+        self._plan_hits = 0
+        self._plan_misses = 0
+        
+        # 可选的画面变化门控，画面未变化时复用上次检测结果
+        self.change_gate = None
+        
+        # 调试截图保存器（DebugSink），由各模块共用，None表示不保存
+        self.debug_sink = None
+        
+        # 模板匹配模式：'exact'为全分辨率匹配，'pyramid'为先缩小粗匹配再精匹配
+        self.match_mode = 'exact'
+        self.pyramid_level = 1
+        
+        # 上次位置跟踪（LocationTracker），None表示每次都搜索整个区域
+        self.location_tracker = None
+        
+        # 多尺度匹配的缩放比例缓存（ScaleCache），None表示只按模板原尺寸匹配
+        self.scale_cache = None
+        
+        # 已编译的调色板
+        self._palettes = {}
+        
+        # 批量模板匹配使用的线程池，按需创建
+        self.match_workers = None
+        self._match_executor = None
+        self._match_executor_lock = threading.Lock()
+    
+    def release(self):
+        """释放画面来源占用的资源"""
+        self.stop_background_capture()
+        self.frame_source.close()
+        if self._match_executor is not None:
+            self._match_executor.shutdown(wait=False)
+            self._match_executor = None
+    
+    def release_thread(self):
+        """释放当前线程的截图资源，截图的线程结束前调用"""
+        self.frame_source.release_thread()
+    
+    def enable_change_gate(self, threshold=8, size=(64, 64)):
+        """
+        启用画面变化门控
+        threshold: 缩略图像素最大绝对差阈值，低于该值时复用上次的检测结果
+        size: 缩略图尺寸
+        """
+        self.change_gate = FrameChangeGate(threshold=threshold, size=size)
+        return self.change_gate
+    
+    def disable_change_gate(self):
+        """关闭画面变化门控"""
+        self.change_gate = None
+    
+    def get_change_gate_stats(self):
+        """获取门控跳过统计，未启用时返回None"""
+        if self.change_gate is None:
+            return None
+        return self.change_gate.get_stats()
+    
+    def enable_location_tracking(self, margin=16):
+        """
+        启用上次位置跟踪
+        margin: 小窗口在模板四周额外扩展的像素
+        """
+        self.location_tracker = LocationTracker(margin=margin)
+        return self.location_tracker
+    
+    def disable_location_tracking(self):
+        """关闭上次位置跟踪"""
+        self.location_tracker = None
+    
+    def get_location_tracking_stats(self):
+        """获取位置跟踪的命中率和平均搜索面积，未启用时返回None"""
+        if self.location_tracker is None:
+            return None
+        return self.location_tracker.get_stats()
+    
+    def enable_multi_scale(self, min_scale=0.5, max_scale=2.0, step=0.05, reference_size=None, retry_interval=2.0):
+        """
+        启用多尺度匹配，客户区尺寸与截取模板时不同时按比例缩放模板
+        min_scale, max_scale, step: 搜索的缩放比例范围和步长
+        reference_size: 模板截取时的客户区尺寸 (width, height)
+        retry_interval: 模板不在画面上导致搜索失败后，再次搜索前的等待时间（秒）
+        """
+        self.scale_cache = ScaleCache(min_scale, max_scale, step, reference_size, retry_interval=retry_interval)
+        return self.scale_cache
+    
+    def disable_multi_scale(self):
+        """关闭多尺度匹配"""
+        self.scale_cache = None
+    
+    def get_scale_stats(self):
+        """获取各客户区尺寸的缩放比例和搜索统计，未启用时返回None"""
+        if self.scale_cache is None:
+            return None
+        return self.scale_cache.get_stats()
+    
+    def save_debug_image(self, image, tag):
+        """提交调试截图，由调试保存器在后台写入"""
+        if self.debug_sink is not None:
+            self.debug_sink.submit(image, tag)
     
-    def capture_screen(self, region=None):
-        """捕获游戏窗口屏幕"""
-        hwnd = self.game_window.hwnd
-        if not hwnd:
-            self.game_window.find_window()
-            hwnd = self.game_window.hwnd
+    def run_gated(self, key, screen, compute):
+        """
+        通过画面变化门控执行检测，未启用门控时直接检测
+        key: 检测器名称和参数组成的元组
+        """
+        if self.change_gate is None:
+            return compute()
+        return self.change_gate.run(key, screen, compute)
+    
+    def start_background_capture(self, fps=20, buffer_size=3):
+        """
+        启动后台截图线程，之后的截图直接读取线程发布的最新帧
+        fps: 目标帧率
+        buffer_size: 环形缓冲区槽位数量
+        """
+        if self.is_background_capture_running():
+            return False
+        self.capture_thread = CaptureThread(
+            self.frame_source, fps=fps, buffer_size=buffer_size, generations=self._generations)
+        return self.capture_thread.start()
+    
+    def stop_background_capture(self):
+        """停止后台截图线程"""
+        if self.capture_thread is None:
+            return False
+        result = self.capture_thread.stop()
+        self.capture_thread = None
+        return result
+    
+    def is_background_capture_running(self):
+        """后台截图线程是否在运行"""
+        return self.capture_thread is not None and self.capture_thread.is_running()
+    
+    def get_background_capture_stats(self):
+        """获取后台截图统计信息，未启动时返回None"""
+        if self.capture_thread is None:
+            return None
+        return self.capture_thread.get_stats()
+    
+    def _read_background_frame(self, fresh, cached):
+        """
+        从后台截图线程读取最新帧并复制到当前线程的缓冲区
+        返回: Frame 或 None（线程还没有可用的帧）
+        """
+        latest = self.capture_thread.get_latest()
+        if latest is None or (fresh and cached is not None and latest.generation <= cached.generation):
+            # 需要更新的帧时等待下一帧
+            after = cached.generation if fresh and cached is not None else 0
+            latest = self.capture_thread.wait_for_frame(after, timeout=max(1.0, self.capture_thread.interval * 4))
+            if latest is None:
+                return None
         
-        # 获取窗口尺寸
-        client_rect = self.game_window.get_client_rect()
-        width = client_rect['width']
-        height = client_rect['height']
+        # 复制到本线程的缓冲区，避免后台线程覆盖环形缓冲区槽位
+        buffer = getattr(self._frame_local, 'buffer', None)
+        if buffer is None or buffer.shape != latest.image.shape:
+            buffer = np.empty_like(latest.image)
+            self._frame_local.buffer = buffer
+        np.copyto(buffer, latest.image)
+        return latest._replace(image=buffer)
+    
+    def get_frame(self, fresh=False, max_age=None):
+        """
+        获取当前线程缓存的整帧画面
+        fresh: 是否强制重新截图
+        max_age: 新截取帧的有效期（秒），None使用frame_max_age
+        返回: Frame(image, generation, timestamp, max_age, capture_ms)
+        """
+        now = time.perf_counter()
+        frame = getattr(self._frame_local, 'frame', None)
+        if not fresh and frame is not None and now - frame.timestamp <= frame.max_age:
+            with self._frame_stats_lock:
+                self._frame_hits += 1
+            return frame
         
-        # 定义捕获区域
-        if region:
-            x, y, w, h = region
-            # 确保区域在窗口内
-            x = max(0, min(x, width))
-            y = max(0, min(y, height))
-            w = max(1, min(w, width - x))
-            h = max(1, min(h, height - y))
+        if max_age is None:
+            max_age = self.frame_max_age
+        
+        background_frame = None
+        if self.is_background_capture_running():
+            background_frame = self._read_background_frame(fresh, frame)
+        
+        if background_frame is not None:
+            capture_time = time.perf_counter() - now
+            frame = background_frame._replace(max_age=max_age)
         else:
-            x, y, w, h = 0, 0, width, height
+            image = self.frame_source.capture(None)
+            capture_time = time.perf_counter() - now
+            frame = Frame(
+                image=image,
+                generation=next(self._generations),
+                timestamp=now,
+                max_age=max_age,
+                capture_ms=capture_time * 1000
+            )
+        self._frame_local.frame = frame
+        with self._frame_stats_lock:
+            self._frame_misses += 1
+            self._capture_time_total += capture_time
+        return frame
+    
+    def invalidate_frame(self):
+        """丢弃当前线程缓存的帧和区域规划"""
+        self._frame_local.frame = None
+        self._frame_local.plan = None
+    
+    def begin_tick(self, regions=None, max_age=None):
+        """
+        开始新一轮检测：按区域规划截图，本轮内的capture_screen直接从截取的矩形中裁剪
+        regions: 本轮需要的区域列表，None表示沿用上一轮实际请求过的区域
+        max_age: 本轮截图的有效期（秒），None使用frame_max_age
+        返回: 本轮截取的矩形列表
+        """
+        if max_age is None:
+            max_age = self.frame_max_age
         
-        # 创建设备上下文
-        hdc = win32gui.GetDC(hwnd)
-        mfc_dc = win32ui.CreateDCFromHandle(hdc)
-        save_dc = mfc_dc.CreateCompatibleDC()
+        requested = getattr(self._frame_local, 'requested', None)
+        if regions is None:
+            regions = list(requested) if requested else []
+        self._frame_local.requested = set()
+        self._frame_local.plan = None
+        self._frame_local.frame = None
         
-        # 创建位图对象
-        save_bitmap = win32ui.CreateBitmap()
-        save_bitmap.CreateCompatibleBitmap(mfc_dc, w, h)
-        save_dc.SelectObject(save_bitmap)
+        # 没有可规划的区域、需要整个画面或后台截图运行时，直接截取整帧
+        if not regions or None in regions or self.is_background_capture_running():
+            frame = self.get_frame(fresh=True, max_age=max_age)
+            height, width = frame.image.shape[:2]
+            self._record_plan(1, width * height, width * height)
+            return [(0, 0, width, height)]
         
-        # 复制屏幕到位图
-        save_dc.BitBlt((0, 0), (w, h), mfc_dc, (x, y), win32con.SRCCOPY)
+        now = time.perf_counter()
+        width, height = self.frame_source.get_size()
+        clamped = [clamp_region(region, width, height) for region in regions]
+        rects = self.capture_planner.plan(clamped)
         
-        # 转换位图为图像数据
-        bmp_info = save_bitmap.GetInfo()
-        bmp_str = save_bitmap.GetBitmapBits(True)
-        img = Image.frombuffer(
-            'RGB',
-            (bmp_info['bmWidth'], bmp_info['bmHeight']),
-            bmp_str, 'raw', 'BGRX', 0, 1)
+        # 截图是复用缓冲区的视图，同尺寸的下一次截图会覆盖之前的内容，每张都要复制一份
+        images = [self.frame_source.capture(rect).copy() for rect in rects]
         
-        # 释放资源
-        win32gui.DeleteObject(save_bitmap.GetHandle())
-        save_dc.DeleteDC()
-        mfc_dc.DeleteDC()
-        win32gui.ReleaseDC(hwnd, hdc)
+        self._frame_local.plan = CapturePlan(rects, images, (width, height), now, max_age)
+        self._record_plan(len(rects), sum(w * h for _, _, w, h in rects), width * height)
+        return rects
+    
+    def _record_plan(self, blits, pixels, full_pixels):
+        """记录一轮规划截图的统计信息"""
+        with self._plan_stats_lock:
+            self._plan_ticks += 1
+            self._plan_blits += blits
+            self._plan_pixels += pixels
+            self._plan_full_pixels += full_pixels
+    
+    def _crop_from_plan(self, region):
+        """记录区域请求，并尝试从本轮规划的截图中裁剪"""
+        requested = getattr(self._frame_local, 'requested', None)
+        if requested is None:
+            return None
+        requested.add(region_key(region))
         
-        # 转换为numpy数组/OpenCV格式
-        cv_img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-        return cv_img
+        plan = getattr(self._frame_local, 'plan', None)
+        if plan is None or not plan.is_valid(time.perf_counter()):
+            return None
+        
+        image = plan.crop(region)
+        with self._plan_stats_lock:
+            if image is None:
+                self._plan_misses += 1
+            else:
+                self._plan_hits += 1
+        return image
+    
+    def get_capture_plan_stats(self):
+        """获取区域规划统计信息"""
+        with self._plan_stats_lock:
+            ticks = self._plan_ticks
+            full_pixels = self._plan_full_pixels
+            return {
+                'ticks': ticks,
+                'avg_blits': self._plan_blits / ticks if ticks else 0.0,
+                'avg_pixels': self._plan_pixels / ticks if ticks else 0.0,
+                'pixel_ratio': self._plan_pixels / full_pixels if full_pixels else 0.0,
+                'hits': self._plan_hits,
+                'misses': self._plan_misses
+            }
     
-    def find_template(self, template_path, threshold=0.8, region=None, multiple=False):
+    def get_frame_cache_stats(self):
+        """获取帧缓存统计信息"""
+        with self._frame_stats_lock:
+            hits = self._frame_hits
+            misses = self._frame_misses
+            capture_time_total = self._capture_time_total
+        
+        total = hits + misses
+        avg_capture_ms = capture_time_total * 1000 / misses if misses else 0.0
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'avg_capture_ms': avg_capture_ms,
+            'saved_ms': hits * avg_capture_ms
+        }
+    
+    def capture_screen(self, region=None, fresh=False):
+        """
+        捕获游戏窗口屏幕
+        region: 截取区域 (x, y, width, height)，None表示整个客户区
+        fresh: 是否强制重新截图，否则在缓存帧有效期内直接从缓存帧中裁剪
+        返回: BGR图像。返回的是缓存帧或复用缓冲区的视图，当前线程下一次截图可能覆盖其内容，
+              需要长期保留时请调用 .copy()
+        """
+        if not fresh:
+            image = self._crop_from_plan(region)
+            if image is not None:
+                return image
+        
+        if not self.frame_max_age:
+            if self.is_background_capture_running():
+                # 不缓存时只复制需要的区域
+                latest = self.capture_thread.get_latest() or self.capture_thread.wait_for_frame()
+                if latest is not None:
+                    height, width = latest.image.shape[:2]
+                    x, y, w, h = clamp_region(region, width, height)
+                    return latest.image[y:y + h, x:x + w].copy()
+            return self.frame_source.capture(region)
+        
+        image = self.get_frame(fresh).image
+        height, width = image.shape[:2]
+        x, y, w, h = clamp_region(region, width, height)
+        return image[y:y + h, x:x + w]
+    
+    def find_template(self, template_path, threshold=0.8, region=None, multiple=False, mode=None, color=None):
         """
         在屏幕上查找模板图像
-        template_path: 模板图像路径
+        template_path: 模板图像路径，或模板缓存中的模板名称
         threshold: 匹配阈值
         region: 搜索区域 (x, y, width, height)
-        multiple: 是否查找多个匹配
+        multiple: 是否查找多个匹配，为True时返回 [(center_x, center_y, confidence), ...]
+        mode: 匹配模式，'exact'或'pyramid'，None使用match_mode；查找多个匹配时总是使用'exact'
+        color: 是否按颜色匹配，None使用模板在templates.json中的声明，False时在单通道上匹配
         """
+        if multiple:
+            xs, ys, scores = self.find_template_matches(template_path, threshold, region, color=color)
+            if len(scores) == 0:
+                return None
+            return list(zip(xs.tolist(), ys.tolist(), scores.tolist()))
+        
         # 截取屏幕
         screen = self.capture_screen(region)
-        # 保存截图
-        cv2.imwrite("screenshot.png", screen)
+        # 保存截图用于调试
+        self.save_debug_image(screen, "find_template")
+        
+        mode = mode or self.match_mode
+        key = ('find_template', template_path, threshold, region_key(region), False, mode, color)
+        return self.run_gated(
+            key, screen, lambda: self._match_template(screen, template_path, threshold, region, False, mode, color))
+    
+    def find_template_matches(self, template_path, threshold=0.8, region=None, max_matches=None,
+                              min_distance=None, color=None):
+        """
+        在屏幕上查找模板的所有匹配位置
+        template_path: 模板图像路径，或模板缓存中的模板名称
+        threshold: 匹配阈值
+        region: 搜索区域 (x, y, width, height)
+        max_matches: 最多返回的匹配数量，None表示不限制
+        min_distance: 匹配之间的最小距离，整数或 (dx, dy)，None时为模板尺寸的一半
+        color: 是否按颜色匹配，同find_template
+        返回: (xs, ys, scores) 三个NumPy数组，坐标为匹配中心点，按得分从高到低排列
+        """
+        screen = self.capture_screen(region)
+        self.save_debug_image(screen, "find_template")
+        
+        distance_key = min_distance if min_distance is None or np.isscalar(min_distance) else tuple(min_distance)
+        key = ('find_template', template_path, threshold, region_key(region), True, max_matches, distance_key, color)
+        return self.run_gated(
+            key, screen, lambda: self._match_template(
+                screen, template_path, threshold, region, True, color=color,
+                max_matches=max_matches, min_distance=min_distance))
+    
+    def _get_match_executor(self):
+        """获取模板匹配线程池，OpenCV匹配时会释放GIL，线程数默认等于CPU核心数"""
+        if self._match_executor is None:
+            with self._match_executor_lock:
+                if self._match_executor is None:
+                    self._match_executor = ThreadPoolExecutor(
+                        max_workers=self.match_workers, thread_name_prefix="template_match")
+        return self._match_executor
+    
+    def find_templates(self, template_paths, threshold=0.8, region=None, first_hit=False, mode=None, color=None):
+        """
+        在同一帧上批量查找多个模板
+        template_paths: 模板路径或名称列表
+        threshold: 匹配阈值
+        region: 搜索区域 (x, y, width, height)
+        first_hit: 为True时任一模板匹配成功即返回，其余未完成的模板结果为None
+        mode: 匹配模式，同find_template
+        color: 是否按颜色匹配，同find_template
+        返回: {模板路径或名称: (center_x, center_y, confidence) 或 None}
+        """
+        results = dict.fromkeys(template_paths)
+        if not template_paths:
+            return results
+        
+        # 只截图一次，转换为连续内存避免每次匹配时OpenCV各自复制
+        screen = np.ascontiguousarray(self.capture_screen(region))
+        self.save_debug_image(screen, "find_templates")
+        
+        mode = mode or self.match_mode
+        # 同一通道的画面在所有模板间共用，只转换一次
+        screens = {'bgr': screen}
+        
+        def match(template_path):
+            key = ('find_template', template_path, threshold, region_key(region), False, mode, color)
+            return self.run_gated(
+                key, screen, lambda: self._match_template(
+                    screen, template_path, threshold, region, False, mode, color, screens))
+        
+        if len(template_paths) == 1:
+            results[template_paths[0]] = match(template_paths[0])
+            return results
+        
+        executor = self._get_match_executor()
+        pending = {executor.submit(match, path): path for path in template_paths}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    results[path] = future.result()
+                    if first_hit and results[path] is not None:
+                        return results
+        finally:
+            # 取消还没开始的匹配
+            for future in pending:
+                future.cancel()
+        return results
+    
+    def _match_template(self, screen, template_path, threshold, region, multiple, mode='exact', color=None,
+                        screens=None, max_matches=None, min_distance=None):
+        """
+        在截图中匹配模板，参数含义同find_template和find_template_matches
+        screens: 已转换的各通道画面 {通道: 图像}，批量匹配时共用
+        multiple为True时返回 (xs, ys, scores) 数组
+        """
+        # 从缓存中取出已解码的模板
+        entry = self.template_store.get(template_path)
+        channel = entry.match_channel(color)
+        template = entry.variant(channel)
+        # 带透明通道的模板使用掩码，完全不透明的模板为None，走无掩码的快速路径
+        mask = entry.mask
+        # 纯色模板改用平方差匹配
+        method = select_method(entry.stats(channel)[1])
         
-        # 读取模板图像
-        template = cv2.imread(template_path, cv2.IMREAD_COLOR)
-        if template is None:
-            raise FileNotFoundError(f"找不到模板图像: {template_path}")
+        # 单通道匹配时转换画面
+        if screens is None:
+            screens = {'bgr': screen}
+        if channel not in screens:
+            screens[channel] = convert_channel(screen, channel)
+        screen = screens[channel]
         
-        # 模板匹配
-        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+        # 多尺度匹配时换成当前客户区尺寸下的模板
+        if self.scale_cache is not None:
+            template, mask = self._scaled_template((entry.path, channel), template, mask, screen, threshold, method)
         
         # 获取匹配结果
         if multiple:
-            locations = np.where(result >= threshold)
-            if len(locations[0]) == 0:
-                return None
+            xs, ys, scores = match_all(screen, template, threshold, min_distance, max_matches, method, mask)
             
-            # 合并重叠的区域
+            # 转换为中心点
             h, w = template.shape[:2]
-            rectangles = []
-            for point in zip(*locations[::-1]):
-                rectangles.append([point[0], point[1], point[0] + w, point[1] + h])
+            xs = xs + w // 2
+            ys = ys + h // 2
+            
+            # 如果指定了区域，调整坐标
+            if region:
+                xs += region[0]
+                ys += region[1]
             
-            rectangles, weights = cv2.groupRectangles(rectangles, 1, 0.5)
+            return xs, ys, scores
+        else:
+            tracker = self.location_tracker
+            track_key = (template_path, region_key(region), channel, mode)
+            sh, sw = screen.shape[:2]
+            match = None
+            window = None
+            searched_area = 0
             
-            if len(rectangles) == 0:
-                return None
+            # 先在上次位置附近的小窗口中匹配
+            if tracker is not None:
+                window = tracker.window(track_key, (template.shape[1], template.shape[0]), (sw, sh))
+                if window is not None:
+                    wx, wy, ww, wh = window
+                    match = self._locate_template(
+                        screen[wy:wy + wh, wx:wx + ww], template, mask, entry, channel, threshold, mode, method)
+                    searched_area += ww * wh
+                    if match is not None:
+                        match = (match[0] + wx, match[1] + wy, match[2])
+            window_hit = match is not None
             
-            matches = []
-            for rect in rectangles:
-                x1, y1, x2, y2 = rect
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-                
-                # 如果指定了区域，调整坐标
-                if region:
-                    center_x += region[0]
-                    center_y += region[1]
-                
-                matches.append((center_x, center_y, result[y1, x1]))
+            # 小窗口未命中时搜索整个区域
+            if match is None:
+                match = self._locate_template(screen, template, mask, entry, channel, threshold, mode, method)
+                searched_area += sw * sh
             
-            return matches
-        else:
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            if max_val < threshold:
+            if tracker is not None:
+                tracker.record(track_key, match[:2] if match is not None else None,
+                               searched_area, sw * sh, window is not None, window_hit)
+            if match is None:
                 return None
+            x, y, max_val = match
             
             # 计算中心点
             h, w = template.shape[:2]
-            center_x = max_loc[0] + w // 2
-            center_y = max_loc[1] + h // 2
+            center_x = x + w // 2
+            center_y = y + h // 2
             
             # 如果指定了区域，调整坐标
             if region:
@@ -134,45 +569,133 @@ class ImageManager:
             
             return (center_x, center_y, max_val)
     
-    def find_color(self, target_color, tolerance=5, region=None, multiple=False):
+    def _scaled_template(self, key, template, mask, screen, threshold, method):
+        """
+        取出当前客户区尺寸下的模板和掩码
+        该尺寸的缩放比例未确定时，用这个模板在所有比例下搜索一次
+        """
+        cache = self.scale_cache
+        size = tuple(self.frame_source.get_size())
+        scale = cache.get_scale(size)
+        if scale is None:
+            if cache.should_search(size, key):
+                scale, score = cache.search(size, key, screen, template, threshold, method, mask)
+                if score < threshold:
+                    scale = None
+            if scale is None:
+                scale = cache.estimate(size)
+        if mask is not None:
+            mask = cache.template(size, key + ('mask',), mask, scale, binary=True)
+        return cache.template(size, key, template, scale), mask
+    
+    def _locate_template(self, screen, template, mask, entry, channel, threshold, mode, method):
+        """
+        在画面中匹配单个模板
+        返回: (x, y, score)，坐标为匹配区域左上角；低于阈值时返回None
+        """
+        if mode == 'pyramid':
+            # 缩放后的模板没有预先缩小的版本
+            small_template = small_mask = None
+            if template is entry.variant(channel):
+                small_template = entry.downscaled(self.pyramid_level, channel)
+                small_mask = entry.downscaled_mask(self.pyramid_level)
+            match = match_pyramid(
+                screen, template, threshold, self.pyramid_level,
+                small_template=small_template, method=method, mask=mask, small_mask=small_mask)
+        else:
+            match = match_exact(screen, template, method, mask)
+        if match is None or match[2] < threshold:
+            return None
+        return match
+    
+    def find_color(self, target_color, tolerance=5, region=None, multiple=False, blobs=False,
+                   min_area=1, max_area=None, probe=False, stride=4, min_hits=1):
         """
         在屏幕上查找特定颜色
         target_color: 目标RGB颜色元组 (R, G, B)
         tolerance: 颜色容差
         region: 搜索区域 (x, y, width, height)
-        multiple: 是否查找多个匹配
+        multiple: 是否查找多个匹配，为True时返回所有匹配像素 [(x, y), ...]
+        blobs: 为True时返回连通的颜色区域 [ColorBlob, ...]，按面积从大到小排列
+        min_area, max_area: 颜色区域的面积范围（像素），只在blobs为True时使用
+        probe: 为True时只检查每隔stride个像素的采样点，命中min_hits个后立即返回，
+               适合"颜色是否出现"的检查；返回的坐标在命中点附近按全分辨率修正
         """
         # 截取屏幕
         screen = self.capture_screen(region)
         
-        # 转换为BGR颜色格式(OpenCV使用BGR)
-        target_bgr = (target_color[2], target_color[1], target_color[0])
+        if probe and not multiple and not blobs:
+            key = ('find_color', tuple(target_color), tolerance, region_key(region), 'probe', stride, min_hits)
+            return self.run_gated(
+                key, screen, lambda: self._probe_color(screen, target_color, tolerance, region, stride, min_hits))
         
-        # 创建上下阈值
-        lower = np.array([max(0, c - tolerance) for c in target_bgr])
-        upper = np.array([min(255, c + tolerance) for c in target_bgr])
+        key = ('find_color', tuple(target_color), tolerance, region_key(region), multiple, blobs, min_area, max_area)
+        return self.run_gated(
+            key, screen, lambda: self._match_color(
+                screen, target_color, tolerance, region, multiple, blobs, min_area, max_area))
+    
+    def _probe_color(self, screen, target_color, tolerance, region, stride, min_hits):
+        """在截图中抽样查找颜色，参数含义同find_color"""
+        lower, upper = color_bounds(target_color, tolerance)
+        position = probe_color(screen, lower, upper, stride, min_hits)
+        if position is None:
+            return None
+        
+        # 如果指定了区域，调整坐标
+        x, y = position
+        if region:
+            x += region[0]
+            y += region[1]
+        return (x, y)
+    
+    def find_colors(self, palette, region=None, space='rgb'):
+        """
+        在同一帧上一次查找多种颜色
+        palette: ColorPalette，或 {名称: (颜色, 容差)} 字典（按space编译，编译结果会缓存）
+        region: 搜索区域 (x, y, width, height)
+        space: palette为字典时使用的颜色空间，'rgb'或'hsv'
+        返回: PaletteResult，可以取出每种颜色的掩码、像素数量、第一个匹配点或连通区域
+        """
+        if not isinstance(palette, ColorPalette):
+            palette = self._get_palette(palette, space)
+        
+        screen = self.capture_screen(region)
+        offset = (region[0], region[1]) if region else (0, 0)
+        
+        key = ('find_colors', palette.key, region_key(region))
+        return self.run_gated(key, screen, lambda: PaletteResult(palette, palette.label(screen), offset))
+    
+    def _get_palette(self, colors, space):
+        """编译调色板字典，相同的定义只编译一次"""
+        key = palette_key(colors, space)
+        palette = self._palettes.get(key)
+        if palette is None:
+            palette = ColorPalette(colors, space)
+            self._palettes[key] = palette
+        return palette
+    
+    def _match_color(self, screen, target_color, tolerance, region, multiple, blobs=False, min_area=1, max_area=None):
+        """在截图中查找颜色，参数含义同find_color"""
+        # 创建上下阈值（OpenCV使用BGR）
+        lower, upper = color_bounds(target_color, tolerance)
         
         # 创建掩码
         mask = cv2.inRange(screen, lower, upper)
+        offset = (region[0], region[1]) if region else (0, 0)
+        
+        # 查找颜色区域
+        if blobs:
+            found = find_blobs(mask, min_area, max_area, offset)
+            return found if found else None
         
         # 查找颜色位置
         if multiple:
-            coords = np.column_stack(np.where(mask > 0))
-            if len(coords) == 0:
+            ys, xs = np.nonzero(mask)
+            if len(xs) == 0:
                 return None
             
-            matches = []
-            for coord in coords:
-                y, x = coord
-                
-                # 如果指定了区域，调整坐标
-                if region:
-                    x += region[0]
-                    y += region[1]
-                
-                matches.append((x, y))
-            
-            return matches
+            # 如果指定了区域，调整坐标
+            return list(zip((xs + offset[0]).tolist(), (ys + offset[1]).tolist()))
         else:
             if cv2.countNonZero(mask) == 0:
                 return None
@@ -1,8 +1,6 @@
 import pyautogui
 import random
 import time
-import win32api
-import win32con
 import keyboard
 
 class InputManager:
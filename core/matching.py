@@ -0,0 +1,200 @@
+import cv2
+import numpy as np
+
+
+# 匹配可用的通道，'bgr'为三通道彩色匹配
+CHANNELS = ('bgr', 'gray', 'b', 'g', 'r')
+
+
+def convert_channel(image, channel):
+    """将BGR图像转换为指定通道的连续图像"""
+    if channel == 'bgr':
+        return image
+    if channel == 'gray':
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.extractChannel(image, 'bgr'.index(channel))
+
+
+def downscale(image, level):
+    """按2的level次方缩小图像，使用区域平均保留细节"""
+    if level <= 0:
+        return image
+    factor = 1.0 / (1 << level)
+    return cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+
+def binarize_mask(mask):
+    """缩放后的掩码边缘为中间值，重新二值化为0和255"""
+    return np.where(mask > 127, 255, 0).astype(np.uint8)
+
+
+def find_peaks(result, threshold, min_distance=1, max_count=None):
+    """
+    从匹配得分图中提取峰值（非极大值抑制）
+    result: 匹配得分图，得分越高越匹配
+    threshold: 最低得分
+    min_distance: 峰值之间的最小距离，整数或 (dx, dy)，邻域内只保留得分最高的位置
+    max_count: 最多返回的峰值数量，None表示不限制
+    返回: (xs, ys, scores) 三个NumPy数组，按得分从高到低排列
+    """
+    if np.isscalar(min_distance):
+        dx = dy = int(min_distance)
+    else:
+        dx, dy = (int(d) for d in min_distance)
+    dx, dy = max(dx, 1), max(dy, 1)
+    result = np.ascontiguousarray(result, dtype=np.float32)
+
+    mask = result >= threshold
+    if not mask.any():
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    # 只在超过阈值的像素的外接矩形（加上邻域）内滤波，通常远小于整张得分图
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    y0, y1 = max(0, rows[0] - dy), min(result.shape[0], rows[-1] + dy + 1)
+    x0, x1 = max(0, cols[0] - dx), min(result.shape[1], cols[-1] + dx + 1)
+    result = result[y0:y1, x0:x1]
+    mask = mask[y0:y1, x0:x1]
+
+    # 最大值滤波：邻域内的最大值等于自身的位置才是峰值，只在超过阈值的像素上比较
+    kernel = np.ones((2 * dy + 1, 2 * dx + 1), np.uint8)
+    index = np.flatnonzero(mask)
+    ys, xs = np.divmod(index, result.shape[1])
+    scores = result[ys, xs]
+    keep = scores >= cv2.dilate(result, kernel)[ys, xs]
+    index, ys, xs, scores = index[keep], ys[keep], xs[keep], scores[keep]
+
+    # 平台区域（相邻位置得分相同）只保留邻域内光栅顺序最靠前的一个
+    # 互在邻域内的两个峰值得分必然相等，所以只需检查得分重复的峰值，通常没有或很少
+    ranked = np.lexsort((index, scores))
+    same = scores[ranked[1:]] == scores[ranked[:-1]]
+    if same.any():
+        tied = np.union1d(ranked[1:][same], ranked[:-1][same])
+        if len(tied) <= 2048:
+            ty, tx, tv = ys[tied], xs[tied], scores[tied]
+            near = (np.abs(ty[:, None] - ty) <= dy) & (np.abs(tx[:, None] - tx) <= dx)
+            near &= tv[:, None] == tv
+            near &= tied[None, :] < tied[:, None]
+            drop = tied[near.any(axis=1)]
+        else:
+            # 大片平坦区域时两两比较过大，改用对光栅顺序做最大值滤波
+            order = np.zeros(result.shape, np.float32)
+            order[ys, xs] = result.size - index
+            drop = np.flatnonzero(order[ys, xs] < cv2.dilate(order, kernel)[ys, xs])
+        ys, xs, scores = np.delete(ys, drop), np.delete(xs, drop), np.delete(scores, drop)
+
+    xs += x0
+    ys += y0
+
+    # 先用argpartition取前max_count个，再排序
+    if max_count is not None and len(scores) > max_count:
+        top = np.argpartition(-scores, max_count - 1)[:max_count]
+        xs, ys, scores = xs[top], ys[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return xs[order], ys[order], scores[order]
+
+
+def select_method(template_std):
+    """
+    根据模板标准差选择匹配方法
+    纯色模板的归一化相关系数没有定义，改用归一化平方差
+    """
+    return cv2.TM_CCOEFF_NORMED if template_std > 1e-3 else cv2.TM_SQDIFF_NORMED
+
+
+def match_result(screen, template, method=cv2.TM_CCOEFF_NORMED, mask=None):
+    """
+    计算匹配得分图，得分越高越匹配
+    TM_SQDIFF_NORMED的结果转换为 1 - 差值
+    mask: 单通道掩码，只比较非零位置的像素；None时使用更快的无掩码匹配
+    """
+    if mask is None:
+        result = cv2.matchTemplate(screen, template, method)
+    else:
+        result = cv2.matchTemplate(screen, template, method, mask=mask)
+        # 带掩码时纯色画面区域的归一化结果可能是NaN或无穷大
+        result[~np.isfinite(result)] = 1.0 if method == cv2.TM_SQDIFF_NORMED else -1.0
+    if method == cv2.TM_SQDIFF_NORMED:
+        result = 1.0 - result
+    return result
+
+
+def match_exact(screen, template, method=cv2.TM_CCOEFF_NORMED, mask=None):
+    """
+    全分辨率匹配
+    返回: (x, y, score)，坐标为匹配区域左上角
+    """
+    result = match_result(screen, template, method, mask)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_loc[0], max_loc[1], max_val
+
+
+def match_all(screen, template, threshold, min_distance=None, max_count=None, method=cv2.TM_CCOEFF_NORMED,
+              mask=None):
+    """
+    查找所有匹配位置
+    min_distance: 匹配之间的最小距离，None时为模板尺寸的一半
+    max_count: 最多返回的匹配数量
+    返回: (xs, ys, scores) 三个NumPy数组，坐标为匹配区域左上角，按得分从高到低排列
+    """
+    if min_distance is None:
+        th, tw = template.shape[:2]
+        min_distance = (max(1, tw // 2), max(1, th // 2))
+    result = match_result(screen, template, method, mask)
+    return find_peaks(result, threshold, min_distance, max_count)
+
+
+def match_pyramid(screen, template, threshold, level=1, small_template=None,
+                  candidates=3, coarse_margin=0.15, method=cv2.TM_CCOEFF_NORMED, mask=None, small_mask=None):
+    """
+    金字塔匹配：先在缩小的画面上粗匹配，再在候选位置附近用全分辨率精匹配
+    screen: 画面
+    template: 全分辨率模板
+    threshold: 匹配阈值
+    level: 缩小级别，1为1/2，2为1/4
+    small_template: 预先缩小的模板，None时现场缩小
+    candidates: 精匹配的候选数量
+    coarse_margin: 粗匹配阈值相对threshold的放宽量，缩小后的相似度通常偏低
+    mask: 模板掩码，None表示不使用掩码
+    small_mask: 预先缩小的掩码，None时现场缩小
+    返回: (x, y, score)，坐标为匹配区域左上角；没有候选时返回None
+    """
+    factor = 1 << level
+    th, tw = template.shape[:2]
+    sh, sw = screen.shape[:2]
+
+    # 模板缩小后太小或画面不比模板大多少时，金字塔没有意义
+    if min(tw, th) // factor < 8 or sw < tw * 2 or sh < th * 2:
+        return match_exact(screen, template, method, mask)
+
+    if small_template is None:
+        small_template = downscale(template, level)
+    if mask is not None and small_mask is None:
+        small_mask = binarize_mask(downscale(mask, level))
+    small_screen = downscale(screen, level)
+    if small_screen.shape[0] < small_template.shape[0] or small_screen.shape[1] < small_template.shape[1]:
+        return match_exact(screen, template, method, mask)
+
+    coarse = match_result(small_screen, small_template, method, small_mask)
+    xs, ys, scores = find_peaks(
+        coarse, threshold - coarse_margin,
+        (small_template.shape[1] // 2, small_template.shape[0] // 2), candidates)
+    if len(scores) == 0:
+        return None
+
+    # 在每个候选位置附近精匹配
+    pad = factor * 2
+    best = None
+    for cx, cy in zip(xs.tolist(), ys.tolist()):
+        x0 = max(0, cx * factor - pad)
+        y0 = max(0, cy * factor - pad)
+        x1 = min(sw, cx * factor + tw + pad)
+        y1 = min(sh, cy * factor + th + pad)
+        window = screen[y0:y1, x0:x1]
+        if window.shape[0] < th or window.shape[1] < tw:
+            continue
+        x, y, score = match_exact(window, template, method, mask)
+        if best is None or score > best[2]:
+            best = (x0 + x, y0 + y, score)
+    return best
@@ -1,17 +1,91 @@
 import cv2
 import numpy as np
 import time
-import os
 import traceback
-from paddleocr import PaddleOCR
+import threading
+from concurrent.futures import Future
+
+from .capture import region_key
+from .ocr_cache import OCRResultCache
+from .ocr_scheduler import OCRScheduler
+
+
+class OCRNotReady(Exception):
+    """OCR模型正在加载或加载失败，识别请求没有执行，与"没有识别到文字"区分"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status  # 'loading' 或 'failed'
+
+
+def parse_ocr_result(result, threshold):
+    """
+    解析检测+识别模式的PaddleOCR结果
+    返回: [(文本, 中心坐标, 置信度), ...]，坐标相对输入图像
+    """
+    text_results = []
+    if result is not None and len(result) > 0:
+        for line in result:
+            # 没有检测到文字时该图像的结果为None
+            if not line:
+                continue
+            for item in line:
+                # 解析结果
+                box = item[0]  # 文字区域坐标 [[x1, y1], [x2, y2], [x3, y3], [x4, y4]]
+                text = item[1][0]  # 识别的文字
+                confidence = item[1][1]  # 置信度
+                
+                # 计算中心点坐标
+                center_x = int(sum(point[0] for point in box) / 4)
+                center_y = int(sum(point[1] for point in box) / 4)
+                
+                # 过滤低置信度结果
+                if confidence >= threshold:
+                    text_results.append((text, (center_x, center_y), confidence))
+    
+    return text_results
+
+
+def parse_rec_result(result, threshold, center):
+    """
+    解析只识别模式的PaddleOCR结果
+    center: 输入图像的中心坐标，作为所有文字的坐标
+    """
+    text_results = []
+    if result is not None and len(result) > 0:
+        for line in result:
+            if not line:
+                continue
+            for text, confidence in line:
+                if text and confidence >= threshold:
+                    text_results.append((text, center, confidence))
+    
+    return text_results
+
 
 class OCRManager:
-    def __init__(self, game_window, image_manager, lang='ch'):
+    # 识别模式：'full'为检测+方向分类+识别，'det_rec'跳过方向分类（游戏界面的文字不会旋转），
+    # 'rec'只识别，整个区域作为一行文字，适合位置固定的单行文字框
+    MODES = ('full', 'det_rec', 'rec')
+    
+    # 初始化失败后再次尝试的最小间隔（秒）
+    RETRY_INTERVAL = 30.0
+    
+    # 使用工作进程时等待单次识别结果的最长时间（秒）
+    WORKER_TIMEOUT = 30.0
+    
+    def __init__(self, game_window, image_manager, lang='ch', mode='full', background=True, warmup=True,
+                 workers=0):
         """
         初始化OCR管理器
         game_window: GameWindow实例
         image_manager: ImageManager实例
         lang: 语言，'ch'为中文，'en'为英文
+        mode: 默认识别模式，见MODES
+        background: 是否在后台线程中加载模型；加载完成前或加载失败后不会阻塞，
+                    recognize_text、find_text、find_texts抛出OCRNotReady，check_captcha返回None
+        warmup: 加载后是否先用空白图像推理一次，消除第一次识别的额外延迟
+        workers: OCR工作进程数量，0表示在本进程中识别；大于0时模型在工作进程中加载，
+                 多个线程的识别请求可以并行执行，不受GIL限制
         """
         self.game_window = game_window
         self.image_manager = image_manager
@@ -19,123 +93,355 @@ class OCRManager:
         self.last_result = None
         self.initialized = False
         self.lang = lang
+        if mode not in self.MODES:
+            print(f"未知的OCR模式 {mode}，使用full")
+            mode = 'full'
+        self.mode = mode
+        
+        # OCR结果缓存（OCRResultCache），None表示不缓存
+        self.result_cache = None
+        
+        # OCR请求调度器（OCRScheduler），None表示在调用线程中直接识别
+        self.scheduler = None
+        
+        # 模型加载状态：'loading'、'ready' 或 'failed'
+        self.warmup = warmup
+        self.status = 'loading'
+        self.ready_future = Future()
+        self._load_lock = threading.Lock()
+        self._failed_at = None
+        self._loading_reported = False
         
-        # 延迟初始化PaddleOCR以避免卡住主线程
-        self._init_ocr()
+        # OCR工作进程池（OCRService），None表示在本进程中识别
+        self.workers = workers
+        self.service = None
+        if workers > 0:
+            self._start_service(workers)
+        # 在后台线程中初始化PaddleOCR，避免卡住主线程
+        elif background:
+            self._start_loading()
+        else:
+            self._init_ocr()
+    
+    def _start_loading(self):
+        """启动后台加载线程"""
+        thread = threading.Thread(target=self._init_ocr, name="ocr_loader")
+        thread.daemon = True
+        thread.start()
     
     def _init_ocr(self):
-        """初始化PaddleOCR模型"""
+        """初始化PaddleOCR模型，完成后设置ready_future的结果"""
+        with self._load_lock:
+            future = self.ready_future
+            try:
+                print(f"正在初始化PaddleOCR({self.lang})，这可能需要一些时间...")
+                start = time.perf_counter()
+                # 推迟到这里才导入paddleocr，导入本身就需要数秒
+                from paddleocr import PaddleOCR
+                self.ocr = PaddleOCR(use_angle_cls=True, lang=self.lang, show_log=False)
+                if self.warmup:
+                    self._warmup()
+                self.initialized = True
+                self.status = 'ready'
+                print(f"PaddleOCR初始化完成，耗时 {time.perf_counter() - start:.1f} 秒")
+                future.set_result(True)
+            except Exception as e:
+                print(f"PaddleOCR初始化失败: {e}")
+                traceback.print_exc()
+                print("OCR功能将不可用")
+                self.ocr = None
+                self.status = 'failed'
+                self._failed_at = time.perf_counter()
+                future.set_result(False)
+    
+    def _start_service(self, workers):
+        """启动工作进程池，工作进程加载完成后更新状态"""
+        from .ocr_service import OCRService
         try:
-            print(f"正在初始化PaddleOCR({self.lang})，这可能需要一些时间...")
-            self.ocr = PaddleOCR(use_angle_cls=True, lang=self.lang, show_log=False)
-            self.initialized = True
-            print("PaddleOCR初始化完成")
+            self.service = OCRService(workers, lang=self.lang, warmup=self.warmup)
         except Exception as e:
-            print(f"PaddleOCR初始化失败: {e}")
+            print(f"OCR工作进程启动失败: {e}")
             traceback.print_exc()
             print("OCR功能将不可用")
+            self.status = 'failed'
+            self._failed_at = time.perf_counter()
+            self.ready_future.set_result(False)
+            return
+        self.service.ready_future.add_done_callback(self._on_service_ready)
+        self.service.exited_future.add_done_callback(self._on_service_exited)
     
-    def _ensure_initialized(self):
-        """确保OCR已初始化"""
-        if not self.initialized and self.ocr is None:
-            try:
-                self._init_ocr()
-            except Exception as e:
-                print(f"无法初始化OCR: {e}")
-                return False
-        return self.initialized
+    def _on_service_ready(self, future):
+        """工作进程池的第一个工作进程加载完成（或全部失败）"""
+        ready = future.result()
+        self.initialized = ready
+        self.status = 'ready' if ready else 'failed'
+        if not ready:
+            print("OCR工作进程全部初始化失败，OCR功能将不可用")
+        if not self.ready_future.done():
+            self.ready_future.set_result(ready)
+    
+    def _on_service_exited(self, future):
+        """工作进程在运行中全部意外退出，之后的识别请求抛出OCRNotReady"""
+        self.initialized = False
+        self.status = 'failed'
+        self._failed_at = time.perf_counter()
+        print("OCR工作进程已全部退出，OCR功能将不可用")
+    
+    def _warmup(self):
+        """用空白图像把检测和识别各推理一次，预先完成推理引擎的初始化"""
+        blank = np.full((64, 320, 3), 255, dtype=np.uint8)
+        cv2.putText(blank, "warmup", (10, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+        try:
+            self.ocr.ocr(blank, cls=(self.mode == 'full'))
+            self.ocr.ocr(blank, det=False, cls=False)
+        except Exception as e:
+            print(f"OCR预热失败: {e}")
+    
+    def is_ready(self):
+        """模型是否已加载完成"""
+        return self.status == 'ready'
+    
+    def wait_until_ready(self, timeout=None):
+        """
+        等待模型加载完成
+        timeout: 最长等待时间（秒），None表示一直等待
+        返回: 模型是否可用；超时时返回False
+        """
+        try:
+            return self.ready_future.result(timeout=timeout)
+        except Exception:
+            return self.is_ready()
+    
+    def _ensure_initialized(self, action="文本识别"):
+        """
+        检查OCR是否可用，不会阻塞等待模型加载
+        action: 调用方的操作名称，用于提示信息
+        OCR不可用时抛出OCRNotReady
+        """
+        if self.status == 'ready':
+            return
+        
+        if self.status == 'loading':
+            # 加载期间只提示一次，避免轮询时刷屏
+            if not self._loading_reported:
+                self._loading_reported = True
+                print(f"OCR模型正在后台加载，暂时跳过{action}")
+            raise OCRNotReady('loading', f"OCR模型正在加载，无法执行{action}")
+        
+        # 初始化失败后间隔一段时间在后台重试，工作进程池不重试
+        print(f"OCR未初始化，无法执行{action}")
+        if self.workers == 0:
+            with self._load_lock:
+                if self.status == 'failed' and time.perf_counter() - self._failed_at >= self.RETRY_INTERVAL:
+                    self.status = 'loading'
+                    self.ready_future = Future()
+                    self._loading_reported = False
+                    self._start_loading()
+        raise OCRNotReady(self.status, f"OCR未初始化，无法执行{action}")
     
-    def recognize_text(self, region=None, threshold=0.6):
+    def recognize_text(self, region=None, threshold=0.6, mode=None, priority='task'):
         """
         识别指定区域的文字
         region: 识别区域 (x, y, width, height)，None表示整个窗口
         threshold: 置信度阈值
+        mode: 识别模式，见MODES，None使用默认模式
+        priority: 启用调度器时的请求优先级，见OCRScheduler.PRIORITIES
         返回: [(文本, 坐标, 置信度), ...]
+        模型尚未加载完成或加载失败时抛出OCRNotReady
         """
-        if not self._ensure_initialized():
-            print("OCR未初始化，无法执行文本识别")
-            return []
+        self._ensure_initialized("文本识别")
         
         try:
             # 捕获屏幕
             screen = self.image_manager.capture_screen(region)
             
             # 保存截图用于调试
-            debug_dir = "debug_ocr"
-            if not os.path.exists(debug_dir):
-                os.makedirs(debug_dir)
-            cv2.imwrite(os.path.join(debug_dir, f"ocr_input_{time.strftime('%Y%m%d_%H%M%S')}.png"), screen)
-            
-            # 进行OCR识别
-            result = self.ocr.ocr(screen, cls=True)
-            self.last_result = result
+            self.image_manager.save_debug_image(screen, "ocr_input")
             
-            # 处理识别结果
-            text_results = []
-            if result is not None and len(result) > 0:
-                for line in result:
-                    for item in line:
-                        # 解析结果
-                        box = item[0]  # 文字区域坐标 [[x1, y1], [x2, y2], [x3, y3], [x4, y4]]
-                        text = item[1][0]  # 识别的文字
-                        confidence = item[1][1]  # 置信度
-                        
-                        # 计算中心点坐标
-                        center_x = int(sum(point[0] for point in box) / 4)
-                        center_y = int(sum(point[1] for point in box) / 4)
-                        
-                        # 如果指定了区域，调整坐标
-                        if region:
-                            center_x += region[0]
-                            center_y += region[1]
-                        
-                        # 过滤低置信度结果
-                        if confidence >= threshold:
-                            text_results.append((text, (center_x, center_y), confidence))
-            
-            return text_results
+            mode = mode or self.mode
+            key = ('recognize_text', region_key(region), threshold, mode)
+            return self.image_manager.run_gated(
+                key, screen, lambda: self._recognize_screen(screen, region, threshold, mode, priority))
         
+        except OCRNotReady:
+            raise
         except Exception as e:
             print(f"OCR识别失败: {e}")
             traceback.print_exc()
             return []
     
-    def find_text(self, target_text, region=None, threshold=0.6, case_sensitive=False):
+    def _recognize_screen(self, screen, region, threshold, mode='full', priority='task'):
+        """对截图进行OCR识别，参数含义同recognize_text"""
+        # 截图内容与缓存中的某次识别完全相同时直接返回
+        cache = self.result_cache
+        key = None
+        if cache is not None:
+            key = cache.content_key(screen, threshold, self.lang, mode)
+            results = cache.get(key)
+            if results is not None:
+                return self._offset_results(results, region)
+        
+        def compute():
+            start = time.perf_counter()
+            results = self._run_ocr(screen, threshold, mode)
+            if cache is not None:
+                cache.put(key, results, (time.perf_counter() - start) * 1000)
+            return results
+        
+        # 交给调度器排队执行，短时间内相同区域的请求共用一次识别
+        scheduler = self.scheduler
+        if scheduler is not None:
+            results = scheduler.run((region_key(region), threshold, mode), compute, priority)
+        else:
+            results = compute()
+        return self._offset_results(results, region)
+    
+    def _run_ocr(self, screen, threshold, mode='full'):
+        """
+        运行PaddleOCR并解析结果
+        返回: [(文本, 坐标, 置信度), ...]，坐标相对截图
+        """
+        if self.service is not None:
+            try:
+                return self.service.recognize(screen, threshold, mode, timeout=self.WORKER_TIMEOUT)
+            except RuntimeError:
+                # 工作进程全部退出时正在等待的请求也报告为OCR不可用
+                if self.status == 'failed':
+                    raise OCRNotReady('failed', "OCR工作进程已全部退出")
+                raise
+        
+        if mode == 'rec':
+            return self._run_rec(screen, threshold)
+        
+        # 进行OCR识别
+        result = self.ocr.ocr(screen, cls=(mode == 'full'))
+        self.last_result = result
+        return parse_ocr_result(result, threshold)
+    
+    def _run_rec(self, screen, threshold):
+        """只运行识别模型，整个截图作为一行文字，坐标为截图中心"""
+        result = self.ocr.ocr(screen, det=False, cls=False)
+        self.last_result = result
+        return parse_rec_result(result, threshold, (screen.shape[1] // 2, screen.shape[0] // 2))
+    
+    @staticmethod
+    def _offset_results(text_results, region):
+        """如果指定了区域，把识别结果的坐标转换为屏幕坐标"""
+        if not region:
+            return list(text_results)
+        return [(text, (x + region[0], y + region[1]), confidence)
+                for text, (x, y), confidence in text_results]
+    
+    def enable_result_cache(self, ttl=5.0, max_entries=64, max_mb=4):
+        """
+        启用OCR结果缓存
+        ttl: 结果的有效时间（秒）
+        max_entries: 最多缓存的结果数量
+        max_mb: 缓存占用内存的上限（MB）
+        """
+        self.result_cache = OCRResultCache(ttl=ttl, max_entries=max_entries, max_mb=max_mb)
+        return self.result_cache
+    
+    def get_result_cache_stats(self):
+        """获取OCR结果缓存的命中率和节省的识别时间，未启用时返回None"""
+        if self.result_cache is None:
+            return None
+        return self.result_cache.get_stats()
+    
+    def enable_scheduler(self, coalesce_window=0.05, concurrency=None, background_idle=0.2, background_max_wait=2.0):
+        """
+        启用OCR请求调度器，任务请求优先于验证码检查等后台请求执行
+        coalesce_window: 合并窗口（秒），窗口内相同区域、相同参数的请求只识别一次
+        concurrency: 同时执行的识别数量，None时使用工作进程数量，没有工作进程时为1
+        background_idle: 只有一个执行位置时，后台请求等任务请求空闲该时间（秒）后才执行
+        background_max_wait: 后台请求最长等待时间（秒）
+        """
+        if self.scheduler is not None:
+            self.scheduler.close()
+        if concurrency is None:
+            concurrency = max(1, self.workers)
+        self.scheduler = OCRScheduler(concurrency=concurrency, coalesce_window=coalesce_window,
+                                      background_idle=background_idle, background_max_wait=background_max_wait)
+        return self.scheduler
+    
+    def get_scheduler_stats(self):
+        """获取调度器的队列深度和等待时间，未启用时返回None"""
+        if self.scheduler is None:
+            return None
+        return self.scheduler.get_stats()
+    
+    def get_service_stats(self):
+        """获取工作进程池统计信息，未使用工作进程时返回None"""
+        if self.service is None:
+            return None
+        return self.service.get_stats()
+    
+    def close(self):
+        """停止调度器和OCR工作进程"""
+        if self.scheduler is not None:
+            self.scheduler.close()
+        if self.service is not None:
+            self.service.close()
+    
+    def find_text(self, target_text, region=None, threshold=0.6, case_sensitive=False, mode=None, priority='task'):
         """
         在屏幕上查找指定文字
         target_text: 要查找的文字
         region: 搜索区域 (x, y, width, height)
         threshold: 置信度阈值
         case_sensitive: 是否区分大小写
+        mode: 识别模式，同recognize_text
+        priority: 请求优先级，同recognize_text
         返回: (center_x, center_y, confidence) 或 None
+        模型尚未加载完成或加载失败时抛出OCRNotReady
         """
-        if not self._ensure_initialized():
-            print("OCR未初始化，无法执行文本查找")
-            return None
+        return self.find_texts([target_text], region, threshold, case_sensitive, mode=mode,
+                               priority=priority)[target_text]
+    
+    def find_texts(self, keywords, region=None, threshold=0.6, case_sensitive=False, partial=False, mode=None,
+                   priority='task'):
+        """
+        识别一次，在结果中查找多个关键词
+        keywords: 关键词列表
+        region: 搜索区域 (x, y, width, height)
+        threshold: 置信度阈值
+        case_sensitive: 是否区分大小写
+        partial: 为False时文字需与关键词完全相同，为True时文字包含关键词即可
+        mode: 识别模式，同recognize_text
+        priority: 请求优先级，同recognize_text
+        返回: {关键词: (center_x, center_y, confidence) 或 None}，每个关键词取置信度最高的匹配
+        模型尚未加载完成或加载失败时抛出OCRNotReady
+        """
+        self._ensure_initialized("文本查找")
+        matches = dict.fromkeys(keywords)
         
         try:
             # 识别文字
-            text_results = self.recognize_text(region, threshold)
+            text_results = self.recognize_text(region, threshold, mode, priority)
             
-            # 查找匹配文字
-            best_match = None
-            highest_confidence = threshold
+            # 关键词只转换一次大小写
+            targets = [(keyword, keyword if case_sensitive else keyword.lower()) for keyword in keywords]
+            best_confidence = dict.fromkeys(keywords, threshold)
             
             for text, coords, confidence in text_results:
-                # 检查文字是否匹配
-                if (case_sensitive and target_text == text) or \
-                   (not case_sensitive and target_text.lower() == text.lower()):
-                    # 选择置信度最高的匹配
-                    if confidence > highest_confidence:
-                        highest_confidence = confidence
-                        best_match = (coords[0], coords[1], confidence)
+                if not case_sensitive:
+                    text = text.lower()
+                for keyword, target in targets:
+                    # 检查文字是否匹配
+                    if (target in text) if partial else (target == text):
+                        # 选择置信度最高的匹配
+                        if confidence > best_confidence[keyword]:
+                            best_confidence[keyword] = confidence
+                            matches[keyword] = (coords[0], coords[1], confidence)
             
-            return best_match
+            return matches
         
+        except OCRNotReady:
+            raise
         except Exception as e:
             print(f"文本查找失败: {e}")
             traceback.print_exc()
-            return None
+            return matches
     
     def click_text(self, target_text, region=None, threshold=0.6, case_sensitive=False, right_click=False):
         """
@@ -145,10 +451,11 @@ class OCRManager:
         threshold: 置信度阈值
         case_sensitive: 是否区分大小写
         right_click: 是否右键点击
-        返回: 是否成功点击
+        返回: 是否成功点击，OCR不可用时返回False
         """
-        if not self._ensure_initialized():
-            print("OCR未初始化，无法执行点击文本")
+        try:
+            self._ensure_initialized("点击文本")
+        except OCRNotReady:
             return False
         
         try:
@@ -161,38 +468,42 @@ class OCRManager:
             
             return False
         
+        except OCRNotReady:
+            return False
         except Exception as e:
             print(f"点击文本失败: {e}")
             traceback.print_exc()
             return False
     
-    def check_captcha(self, captcha_keywords=None, region=None):
+    def check_captcha(self, captcha_keywords=None, region=None, priority='background'):
         """
         检查是否出现验证码
         captcha_keywords: 验证码关键词列表，如 ["验证码", "安全验证", "captcha"]
         region: 搜索区域 (x, y, width, height)
-        返回: 是否检测到验证码
+        priority: 请求优先级，默认作为后台请求，不抢占任务中的识别
+        返回: 是否检测到验证码；OCR尚未就绪、无法检查时返回None
         """
-        if not self._ensure_initialized():
-            print("OCR未初始化，无法执行验证码检查")
-            return False
+        try:
+            self._ensure_initialized("验证码检查")
+        except OCRNotReady:
+            return None
         
         if captcha_keywords is None:
             captcha_keywords = ["验证码", "安全验证", "验证", "captcha", "CAPTCHA", "Captcha"]
         
         try:
-            # 识别文字
-            text_results = self.recognize_text(region, threshold=0.6)
-            
-            # 检查是否包含验证码关键词
-            for text, coords, confidence in text_results:
-                for keyword in captcha_keywords:
-                    if keyword in text:
-                        print(f"检测到疑似验证码关键词: '{text}'")
-                        return True
+            # 识别一次，检查是否包含任一验证码关键词
+            matches = self.find_texts(captcha_keywords, region, threshold=0.6, case_sensitive=True, partial=True,
+                                      priority=priority)
+            for keyword, match in matches.items():
+                if match:
+                    print(f"检测到疑似验证码关键词: '{keyword}'")
+                    return True
             
             return False
         
+        except OCRNotReady:
+            return None
         except Exception as e:
             print(f"验证码检查失败: {e}")
             traceback.print_exc()
@@ -0,0 +1,106 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class OCRResultCache:
+    def __init__(self, ttl=5.0, max_entries=64, max_mb=4):
+        """
+        OCR结果缓存：以截图内容的哈希为键，画面像素完全相同时直接返回上次的识别结果
+        ttl: 结果的有效时间（秒），None表示不过期
+        max_entries: 最多缓存的结果数量
+        max_mb: 缓存结果占用内存的上限（MB，按文字长度估算）
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict()  # key -> (结果, 识别耗时ms, 写入时间, 估算大小)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.saved_ms = 0.0
+
+    @staticmethod
+    def content_key(image, *params):
+        """
+        计算截图内容的键：尺寸加像素数据的SHA1，再附加识别参数
+        SHA1在1280x720的整帧上约2-3毫秒，相对OCR的耗时可以忽略，且不会因为碰撞返回错误的文字
+        """
+        data = np.ascontiguousarray(image)
+        digest = hashlib.sha1(data).digest()
+        return (data.shape, digest) + params
+
+    @staticmethod
+    def _estimate_size(results):
+        """估算识别结果占用的内存"""
+        return 64 + sum(96 + len(text.encode('utf-8')) for text, _, _ in results)
+
+    def get(self, key):
+        """取出缓存的结果，不存在或已过期时返回None"""
+        now = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            results, ocr_ms, created, size = entry
+            if self.ttl is not None and now - created > self.ttl:
+                del self._entries[key]
+                self._total_bytes -= size
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += ocr_ms
+            return list(results)
+
+    def put(self, key, results, ocr_ms):
+        """
+        写入识别结果
+        ocr_ms: 本次识别的耗时，命中时计入节省的时间
+        """
+        size = self._estimate_size(results)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[3]
+            self._entries[key] = (tuple(results), ocr_ms, time.perf_counter(), size)
+            self._total_bytes += size
+
+            # 淘汰最久未使用的结果
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted[3]
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'saved_ms': self.saved_ms
+            }
@@ -0,0 +1,204 @@
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+
+
+class OCRScheduler:
+    # 优先级：'task'为任务流程中等待结果的识别，'background'为验证码检查等后台轮询
+    PRIORITIES = ('task', 'background')
+
+    def __init__(self, concurrency=1, coalesce_window=0.05, background_limit=None, background_idle=0.2,
+                 background_max_wait=2.0):
+        """
+        OCR请求调度器：所有识别请求按优先级排队，由固定数量的线程执行
+        同一区域、相同参数的请求在短时间内重复提交时合并为一次识别
+        concurrency: 同时执行的识别数量，在本进程中识别时应为1，使用工作进程时可等于工作进程数量
+        coalesce_window: 合并窗口（秒），排队或正在执行的相同请求提交时间在该窗口内时直接共用结果
+        background_limit: 同时执行的后台请求数量上限，None为concurrency - 1，给任务请求保留一个执行位置
+        background_idle: 后台请求没有可用位置时（如concurrency为1），只在没有任务请求执行、
+                         且距上一次任务请求超过该时间（秒）后才借用任务的位置执行
+        background_max_wait: 后台请求最长等待时间（秒），超过后不再等待任务空闲，避免验证码检查被饿死
+        """
+        self.concurrency = max(1, int(concurrency))
+        self.coalesce_window = coalesce_window
+        if background_limit is None:
+            background_limit = self.concurrency - 1
+        self.background_limit = max(0, min(background_limit, self.concurrency))
+        self.background_idle = background_idle
+        self.background_max_wait = background_max_wait
+
+        self._condition = threading.Condition()
+        self._queue = []  # (优先级序号, 序号, 请求)
+        self._sequence = itertools.count()
+        self._inflight = {}  # key -> 排队或正在执行的请求
+        self._running = dict.fromkeys(self.PRIORITIES, 0)
+        self._last_task = 0.0  # 最近一次任务请求提交或完成的时间
+        self._closed = False
+
+        # 统计信息，按优先级分组
+        self._submitted = dict.fromkeys(self.PRIORITIES, 0)
+        self._coalesced = dict.fromkeys(self.PRIORITIES, 0)
+        self._executed = dict.fromkeys(self.PRIORITIES, 0)
+        self._wait_total = dict.fromkeys(self.PRIORITIES, 0.0)
+        self._wait_max = dict.fromkeys(self.PRIORITIES, 0.0)
+        self._max_depth = 0
+
+        self._threads = []
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run_loop, name=f"ocr_scheduler_{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, compute, priority='task'):
+        """
+        提交识别请求，立即返回Future
+        key: 区域及识别参数组成的可哈希键，相同key的请求可以合并
+        compute: 无参数的识别函数，返回识别结果
+        priority: 优先级，见PRIORITIES
+        """
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"未知的OCR请求优先级: {priority}")
+
+        now = time.perf_counter()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("OCR调度器已关闭")
+            self._submitted[priority] += 1
+            if priority == 'task':
+                self._last_task = now
+
+            # 合并到窗口内提交的相同请求；任务请求合并到排队中的后台请求时提升其优先级
+            request = self._inflight.get(key)
+            if request is not None and now - request['submitted_at'] <= self.coalesce_window:
+                self._coalesced[priority] += 1
+                if request['started_at'] is None and priority == 'task' and request['priority'] != 'task':
+                    self._promote(request)
+                return request['future']
+
+            request = {
+                'key': key,
+                'compute': compute,
+                'priority': priority,
+                'future': Future(),
+                'submitted_at': now,
+                'started_at': None
+            }
+            self._inflight[key] = request
+            heapq.heappush(self._queue, (self.PRIORITIES.index(priority), next(self._sequence), request))
+            self._max_depth = max(self._max_depth, len(self._queue))
+            self._condition.notify()
+            return request['future']
+
+    def run(self, key, compute, priority='task', timeout=None):
+        """提交识别请求并等待结果，参数含义同submit"""
+        return self.submit(key, compute, priority).result(timeout=timeout)
+
+    def _promote(self, request):
+        """把排队中的请求提升为任务优先级，调用时需持有锁"""
+        request['priority'] = 'task'
+        self._queue = [(0 if item[2] is request else item[0], item[1], item[2]) for item in self._queue]
+        heapq.heapify(self._queue)
+        self._condition.notify_all()
+
+    def _next_request(self):
+        """
+        取出下一个可执行的请求，调用时需持有锁
+        返回: (请求, 等待时间)；没有可执行的请求时请求为None，等待时间为再次检查前的等待时间（秒），None表示一直等待
+        """
+        if not self._queue:
+            return None, None
+        request = self._queue[0][2]
+        if request['priority'] == 'background' and self._running['background'] >= self.background_limit:
+            # 没有后台可用的位置时，等任务空闲一段时间或后台请求等待过久后再借用任务的位置
+            if self._running['task'] > 0 or self._running['background'] > 0:
+                return None, None
+            now = time.perf_counter()
+            idle_at = self._last_task + self.background_idle
+            overdue_at = request['submitted_at'] + self.background_max_wait
+            if now < idle_at and now < overdue_at:
+                return None, min(idle_at, overdue_at) - now
+        heapq.heappop(self._queue)
+        return request, None
+
+    def _run_loop(self):
+        """执行线程"""
+        while True:
+            with self._condition:
+                request, timeout = self._next_request()
+                while request is None:
+                    if self._closed:
+                        return
+                    self._condition.wait(timeout)
+                    request, timeout = self._next_request()
+
+                priority = request['priority']
+                request['started_at'] = time.perf_counter()
+                wait = request['started_at'] - request['submitted_at']
+                self._running[priority] += 1
+                self._executed[priority] += 1
+                self._wait_total[priority] += wait
+                self._wait_max[priority] = max(self._wait_max[priority], wait)
+
+            try:
+                result = request['compute']()
+            except Exception as e:
+                request['future'].set_exception(e)
+            else:
+                request['future'].set_result(result)
+            finally:
+                with self._condition:
+                    self._running[priority] -= 1
+                    if priority == 'task':
+                        self._last_task = time.perf_counter()
+                    if self._inflight.get(request['key']) is request:
+                        del self._inflight[request['key']]
+                    self._condition.notify_all()
+
+    def close(self, timeout=2.0):
+        """停止执行线程，排队中的请求以异常结束"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            pending = [item[2] for item in self._queue]
+            self._queue.clear()
+            self._inflight.clear()
+            self._condition.notify_all()
+        for request in pending:
+            request['future'].set_exception(RuntimeError("OCR调度器已关闭"))
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def get_stats(self):
+        """
+        获取统计信息
+        返回: {'queue_depth', 'max_queue_depth', 'running', 'priorities': {优先级: {...}}}
+        等待时间为请求从提交到开始执行的时间，只统计实际执行的请求
+        """
+        with self._condition:
+            depth = dict.fromkeys(self.PRIORITIES, 0)
+            for _, _, request in self._queue:
+                depth[request['priority']] += 1
+
+            priorities = {}
+            for priority in self.PRIORITIES:
+                submitted = self._submitted[priority]
+                executed = self._executed[priority]
+                priorities[priority] = {
+                    'submitted': submitted,
+                    'coalesced': self._coalesced[priority],
+                    'coalesce_rate': self._coalesced[priority] / submitted if submitted else 0.0,
+                    'executed': executed,
+                    'queued': depth[priority],
+                    'avg_wait_ms': self._wait_total[priority] * 1000 / executed if executed else 0.0,
+                    'max_wait_ms': self._wait_max[priority] * 1000
+                }
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self._max_depth,
+                'running': sum(self._running.values()),
+                'priorities': priorities
+            }
@@ -0,0 +1,370 @@
+import os
+import time
+import queue
+import atexit
+import itertools
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from .ocr import parse_ocr_result, parse_rec_result
+
+
+def _worker_main(worker_id, lang, warmup, tasks, results):
+    """
+    OCR工作进程：加载自己的PaddleOCR模型，从共享内存读取画面并识别
+    tasks: 任务队列，元素为 (任务ID, 共享内存名称, 画面形状, 置信度阈值, 识别模式, 是否临时共享内存)，
+           None表示退出
+    results: 结果队列，元素为 (类型, 工作进程或任务ID, 数据)，开始处理任务时先发送 ('start', 任务ID, 工作进程ID)，
+             工作进程意外退出时主进程据此结束它手上的任务
+    """
+    try:
+        from paddleocr import PaddleOCR
+        ocr = PaddleOCR(use_angle_cls=True, lang=lang, show_log=False)
+        if warmup:
+            blank = np.full((64, 320, 3), 255, dtype=np.uint8)
+            cv2.putText(blank, "warmup", (10, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+            ocr.ocr(blank)
+            ocr.ocr(blank, det=False, cls=False)
+    except Exception as e:
+        results.put(('failed', worker_id, str(e)))
+        return
+    results.put(('ready', worker_id, None))
+
+    segments = {}  # 共享内存名称 -> SharedMemory，槽位会反复使用，打开一次即可
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        task_id, name, shape, threshold, mode, temporary = task
+        results.put(('start', task_id, worker_id))
+        try:
+            segment = segments.get(name)
+            if segment is None:
+                # spawn启动的工作进程与主进程共用resource_tracker，共享内存仍由主进程负责删除
+                segment = shared_memory.SharedMemory(name=name)
+                segments[name] = segment
+            screen = np.ndarray(shape, dtype=np.uint8, buffer=segment.buf)
+
+            start = time.perf_counter()
+            if mode == 'rec':
+                result = ocr.ocr(screen, det=False, cls=False)
+                text_results = parse_rec_result(result, threshold, (shape[1] // 2, shape[0] // 2))
+            else:
+                result = ocr.ocr(screen, cls=(mode == 'full'))
+                text_results = parse_ocr_result(result, threshold)
+            del screen
+            results.put(('done', task_id, (text_results, (time.perf_counter() - start) * 1000)))
+        except Exception as e:
+            results.put(('error', task_id, f"{type(e).__name__}: {e}"))
+
+        # 临时共享内存只使用一次
+        if temporary and name in segments:
+            segments.pop(name).close()
+
+    for segment in segments.values():
+        try:
+            segment.close()
+        except BufferError:
+            pass
+
+
+class OCRService:
+    def __init__(self, workers=1, lang='ch', warmup=True, slots=None, slot_bytes=1920 * 1080 * 3,
+                 slot_timeout=30.0):
+        """
+        OCR工作进程池：每个进程加载自己的PaddleOCR模型，多个识别请求可以在多个CPU核心上并行
+        画面通过共享内存传给工作进程，不经过pickle序列化
+        workers: 工作进程数量
+        lang: 语言，'ch'为中文，'en'为英文
+        warmup: 工作进程加载后是否先推理一次
+        slots: 共享内存槽位数量，即同时等待识别的最大请求数，None为工作进程数量的2倍
+        slot_bytes: 每个槽位的大小（字节），超过该大小的画面使用临时共享内存
+        slot_timeout: 提交请求时等待空闲槽位的最长时间（秒）
+        """
+        self.workers = max(1, int(workers))
+        self.lang = lang
+        self.slot_bytes = int(slot_bytes)
+        self.slot_timeout = slot_timeout
+
+        # Windows只支持spawn，其他平台也使用spawn，避免fork带走主进程的线程和模型状态
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+
+        self._slots = []
+        self._free_slots = queue.Queue()
+        for i in range(slots or self.workers * 2):
+            segment = shared_memory.SharedMemory(
+                name=f"ocr_slot_{os.getpid()}_{i}", create=True, size=self.slot_bytes)
+            self._slots.append(segment)
+            self._free_slots.put(i)
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}  # 任务ID -> (Future, 槽位序号或临时共享内存, 提交时间)
+        self._assigned = {}  # 任务ID -> 正在处理该任务的工作进程ID
+        self._ready_ids = set()  # 已就绪的工作进程ID
+        self._dead_ids = set()  # 已处理过退出的工作进程ID
+        self._last_check = time.perf_counter()
+        self._closed = False
+        self._exited = False
+
+        # 工作进程状态，exited_future在工作进程全部意外退出时完成
+        self.ready_future = Future()
+        self.exited_future = Future()
+        self.ready_workers = 0
+        self.failed_workers = 0
+
+        # 统计信息
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.oversized = 0
+        self._infer_time_total = 0.0
+        self._roundtrip_time_total = 0.0
+
+        print(f"正在启动 {self.workers} 个OCR工作进程...")
+        self._processes = []
+        for worker_id in range(self.workers):
+            process = context.Process(
+                target=_worker_main, args=(worker_id, lang, warmup, self._tasks, self._results),
+                name=f"ocr_worker_{worker_id}")
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+
+        self._collector = threading.Thread(target=self._collect_loop, name="ocr_results")
+        self._collector.daemon = True
+        self._collector.start()
+
+        # 退出时停止工作进程并释放共享内存
+        atexit.register(self.close)
+
+    def is_ready(self):
+        """是否至少有一个工作进程加载完成"""
+        return self.ready_workers > 0
+
+    def wait_until_ready(self, timeout=None):
+        """
+        等待第一个工作进程加载完成
+        返回: 是否可用；超时时返回False
+        """
+        try:
+            return self.ready_future.result(timeout=timeout)
+        except Exception:
+            return self.is_ready()
+
+    def submit(self, screen, threshold=0.6, mode='full'):
+        """
+        提交识别请求，立即返回Future
+        所有槽位都在使用时等待空闲槽位，超过slot_timeout时抛出RuntimeError
+        screen: BGR画面
+        threshold: 置信度阈值
+        mode: 识别模式，见OCRManager.MODES
+        Future结果: [(文本, 坐标, 置信度), ...]，坐标相对画面
+        """
+        if self._closed:
+            raise RuntimeError("OCR工作进程池已关闭")
+        if self._exited:
+            raise RuntimeError("OCR工作进程已全部退出")
+
+        screen = np.ascontiguousarray(screen, dtype=np.uint8)
+        if screen.nbytes <= self.slot_bytes:
+            try:
+                slot = self._free_slots.get(timeout=self.slot_timeout)
+            except queue.Empty:
+                raise RuntimeError(f"等待OCR共享内存槽位超时（{self.slot_timeout} 秒）")
+            segment = self._slots[slot]
+        else:
+            # 画面超过槽位大小时临时创建共享内存，识别完成后释放
+            segment = shared_memory.SharedMemory(create=True, size=screen.nbytes)
+            slot = segment
+            with self._lock:
+                self.oversized += 1
+        np.ndarray(screen.shape, dtype=np.uint8, buffer=segment.buf)[...] = screen
+
+        future = Future()
+        with self._lock:
+            task_id = next(self._ids)
+            self._pending[task_id] = (future, slot, time.perf_counter())
+            self.submitted += 1
+        self._tasks.put((task_id, segment.name, screen.shape, threshold, mode, not isinstance(slot, int)))
+        return future
+
+    def recognize(self, screen, threshold=0.6, mode='full', timeout=None):
+        """提交识别请求并等待结果，参数含义同submit"""
+        return self.submit(screen, threshold, mode).result(timeout=timeout)
+
+    def _release(self, slot):
+        """归还槽位或释放临时共享内存"""
+        if isinstance(slot, int):
+            self._free_slots.put(slot)
+        else:
+            slot.close()
+            slot.unlink()
+
+    def _collect_loop(self):
+        """结果收集线程：把工作进程的结果交给对应的Future"""
+        while True:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+
+            # 结果持续到达时也定期检查工作进程是否退出
+            if time.perf_counter() - self._last_check >= 1.0:
+                self._check_workers()
+
+            kind, ident, payload = message
+            if kind == 'start':
+                with self._lock:
+                    if ident in self._pending:
+                        self._assigned[ident] = payload
+                continue
+            if kind == 'ready':
+                with self._lock:
+                    self._ready_ids.add(ident)
+                    self.ready_workers += 1
+                print(f"OCR工作进程 {ident} 已就绪")
+                if not self.ready_future.done():
+                    self.ready_future.set_result(True)
+                continue
+            if kind == 'failed':
+                with self._lock:
+                    self.failed_workers += 1
+                    all_failed = self.failed_workers >= self.workers
+                print(f"OCR工作进程 {ident} 初始化失败: {payload}")
+                if all_failed and not self.ready_future.done():
+                    self.ready_future.set_result(False)
+                continue
+
+            with self._lock:
+                entry = self._pending.pop(ident, None)
+                self._assigned.pop(ident, None)
+            if entry is None:
+                continue
+            future, slot, submitted_at = entry
+            self._release(slot)
+
+            with self._lock:
+                self._roundtrip_time_total += time.perf_counter() - submitted_at
+                if kind == 'done':
+                    self.completed += 1
+                    self._infer_time_total += payload[1] / 1000
+                else:
+                    self.errors += 1
+            if kind == 'done':
+                future.set_result(payload[0])
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _check_workers(self):
+        """
+        检查意外退出的工作进程：它正在处理的请求以异常结束并归还槽位
+        工作进程全部退出时，所有未完成的请求以异常结束，之后的请求直接失败
+        """
+        self._last_check = time.perf_counter()
+        if self._closed or self._exited:
+            return
+
+        for worker_id, process in enumerate(self._processes):
+            if process.is_alive() or worker_id in self._dead_ids:
+                continue
+            with self._lock:
+                self._dead_ids.add(worker_id)
+                was_ready = worker_id in self._ready_ids
+                if was_ready:
+                    self._ready_ids.discard(worker_id)
+                    self.ready_workers -= 1
+                lost = [task_id for task_id, owner in self._assigned.items() if owner == worker_id]
+                entries = []
+                for task_id in lost:
+                    del self._assigned[task_id]
+                    entry = self._pending.pop(task_id)
+                    entries.append(entry)
+                    self.errors += 1
+                    self._roundtrip_time_total += self._last_check - entry[2]
+            # 初始化失败的工作进程已经报告过，不再重复提示
+            if was_ready or entries:
+                print(f"OCR工作进程 {worker_id} 意外退出（退出码 {process.exitcode}），"
+                      f"{len(entries)} 个请求失败")
+            self._fail_entries(entries, f"OCR工作进程 {worker_id} 意外退出")
+
+        if len(self._dead_ids) == len(self._processes):
+            self._exited = True
+            print("OCR工作进程已全部退出")
+            # 先通知使用方，等待中的请求失败时使用方已经知道OCR不可用
+            self.exited_future.set_result(True)
+            self._fail_pending("OCR工作进程已全部退出")
+
+    def _fail_entries(self, entries, reason):
+        """请求以异常结束，并归还槽位"""
+        for future, slot, _ in entries:
+            self._release(slot)
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+
+    def _fail_pending(self, reason):
+        """未完成的请求以异常结束，并归还槽位"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._assigned.clear()
+        self._fail_entries(pending, reason)
+        if not self.ready_future.done():
+            self.ready_future.set_result(False)
+
+    def close(self, timeout=5.0):
+        """停止工作进程，未完成的请求以异常结束，并释放共享内存"""
+        if self._closed:
+            return
+        self._closed = True
+
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=1.0)
+
+        self._results.put(None)
+        self._collector.join(timeout=timeout)
+
+        self._fail_pending("OCR工作进程池已关闭")
+        for segment in self._slots:
+            try:
+                segment.close()
+                segment.unlink()
+            except (BufferError, FileNotFoundError):
+                traceback.print_exc()
+
+    def get_stats(self):
+        """获取统计信息"""
+        with self._lock:
+            completed = self.completed
+            finished = completed + self.errors
+            return {
+                'workers': self.workers,
+                'ready_workers': self.ready_workers,
+                'failed_workers': self.failed_workers,
+                'submitted': self.submitted,
+                'completed': completed,
+                'errors': self.errors,
+                'pending': len(self._pending),
+                'oversized': self.oversized,
+                'avg_infer_ms': self._infer_time_total * 1000 / completed if completed else 0.0,
+                'avg_roundtrip_ms': self._roundtrip_time_total * 1000 / finished if finished else 0.0
+            }
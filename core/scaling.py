@@ -0,0 +1,145 @@
+import time
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .matching import match_result, binarize_mask
+
+
+def scale_image(image, scale):
+    """按比例缩放图像，缩小时使用区域平均，放大时使用线性插值"""
+    if abs(scale - 1.0) < 1e-6:
+        return image
+    height, width = image.shape[:2]
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+class ScaleCache:
+    def __init__(self, min_scale=0.5, max_scale=2.0, step=0.05, reference_size=None, max_sizes=4,
+                 retry_interval=2.0):
+        """
+        多尺度模板匹配的缩放比例缓存
+        模板只在截取时的客户区尺寸下才能匹配；每种客户区尺寸只搜索一次最佳缩放比例，之后只在该比例下匹配
+        min_scale, max_scale, step: 搜索的缩放比例范围和步长
+        reference_size: 模板截取时的客户区尺寸 (width, height)，用于在搜索前估计缩放比例，None表示按1.0估计
+        max_sizes: 最多缓存的客户区尺寸数量
+        retry_interval: 模板不在画面上、搜索失败后，再次用它搜索前的等待时间（秒）
+        """
+        self.scales = np.round(np.arange(min_scale, max_scale + step / 2, step), 4).tolist()
+        if 1.0 not in self.scales:
+            self.scales.append(1.0)
+        self.reference_size = tuple(reference_size) if reference_size else None
+        self.max_sizes = max_sizes
+        self.retry_interval = retry_interval
+        self._sizes = OrderedDict()  # 客户区尺寸 -> {'scale', 'templates', 'failed'}，failed为 模板键 -> 失败时间
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.searches = 0
+        self.hits = 0
+        self._search_time_total = 0.0
+
+    def _size_entry(self, size):
+        """取出客户区尺寸对应的缓存项，不存在时创建"""
+        entry = self._sizes.get(size)
+        if entry is None:
+            entry = {'scale': None, 'templates': {}, 'failed': {}}
+            self._sizes[size] = entry
+            while len(self._sizes) > self.max_sizes:
+                self._sizes.popitem(last=False)
+        self._sizes.move_to_end(size)
+        return entry
+
+    def estimate(self, size):
+        """根据参考尺寸估计缩放比例"""
+        if self.reference_size is None:
+            return 1.0
+        return min(size[0] / self.reference_size[0], size[1] / self.reference_size[1])
+
+    def get_scale(self, size):
+        """客户区尺寸对应的缩放比例，未确定时返回None"""
+        with self._lock:
+            entry = self._sizes.get(size)
+            return entry['scale'] if entry is not None else None
+
+    def template(self, size, key, image, scale, binary=False):
+        """
+        取出按比例缩放后的模板，每种客户区尺寸缓存一份
+        key: 模板及通道组成的键
+        binary: 是否为掩码，缩放后重新二值化
+        """
+        if abs(scale - 1.0) < 1e-6:
+            return image
+        with self._lock:
+            templates = self._size_entry(size)['templates']
+            scaled = templates.get((key, scale))
+            if scaled is not None:
+                self.hits += 1
+                return scaled
+        scaled = scale_image(image, scale)
+        if binary:
+            scaled = binarize_mask(scaled)
+        with self._lock:
+            self._size_entry(size)['templates'][(key, scale)] = scaled
+        return scaled
+
+    def should_search(self, size, key):
+        """
+        该客户区尺寸的比例还未确定，且这个模板没有搜索过或距上次搜索失败已超过retry_interval
+        模板（如咬钩图标）第一次搜索时常常还没出现在画面上，冷却后在之后的帧上重新搜索
+        """
+        with self._lock:
+            entry = self._size_entry(size)
+            if entry['scale'] is not None:
+                return False
+            failed_at = entry['failed'].get(key)
+            return failed_at is None or time.perf_counter() - failed_at >= self.retry_interval
+
+    def search(self, size, key, screen, image, threshold, method=cv2.TM_CCOEFF_NORMED, mask=None):
+        """
+        在所有缩放比例下匹配模板，得分达到阈值时记住最佳比例
+        mask: 模板掩码，None表示不使用掩码
+        返回: (最佳比例, 最佳得分)
+        """
+        start = time.perf_counter()
+        sh, sw = screen.shape[:2]
+        best_scale, best_score = None, -1.0
+        for scale in self.scales:
+            scaled = scale_image(image, scale)
+            if scaled.shape[0] > sh or scaled.shape[1] > sw or min(scaled.shape[:2]) < 4:
+                continue
+            scaled_mask = binarize_mask(scale_image(mask, scale)) if mask is not None else None
+            _, value, _, _ = cv2.minMaxLoc(match_result(screen, scaled, method, scaled_mask))
+            if value > best_score:
+                best_scale, best_score = scale, value
+
+        with self._lock:
+            self.searches += 1
+            self._search_time_total += time.perf_counter() - start
+            entry = self._size_entry(size)
+            if best_scale is not None and best_score >= threshold:
+                entry['scale'] = best_scale
+                entry['templates'].clear()
+            else:
+                # 模板不在画面上，冷却一段时间后再用它搜索
+                entry['failed'][key] = time.perf_counter()
+        return best_scale, best_score
+
+    def reset(self):
+        """清空所有尺寸的缓存"""
+        with self._lock:
+            self._sizes.clear()
+
+    def get_stats(self):
+        """获取缩放比例缓存统计"""
+        with self._lock:
+            return {
+                'scales': {size: entry['scale'] for size, entry in self._sizes.items()},
+                'searches': self.searches,
+                'template_hits': self.hits,
+                'avg_search_ms': self._search_time_total * 1000 / self.searches if self.searches else 0.0
+            }
@@ -0,0 +1,463 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from utils.tools import get_all_templates
+
+from .matching import downscale, binarize_mask, convert_channel, CHANNELS
+
+
+class TemplateEntry:
+    def __init__(self, name, path, image, mtime, decode_ms, color=True, channel='gray'):
+        """
+        解码后的模板及其预处理结果
+        image: cv2.IMREAD_UNCHANGED读取的原始图像
+        color: 匹配时是否需要区分颜色，False时使用单通道匹配
+        channel: 单通道匹配使用的通道，'gray'、'b'、'g' 或 'r'
+        """
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.decode_ms = decode_ms
+        self.checked_at = time.perf_counter()
+        self.color = color
+        self.channel = channel
+
+        # 统一为8位图像
+        if image.dtype == np.uint16:
+            image = (image >> 8).astype(np.uint8)
+
+        # 预先计算BGR、灰度和掩码
+        if image.ndim == 2:
+            bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            alpha = None
+        elif image.shape[2] == 4:
+            bgr = np.ascontiguousarray(image[:, :, :3])
+            alpha = image[:, :, 3]
+        else:
+            bgr = image
+            alpha = None
+
+        # 完全不透明的alpha通道不需要掩码，匹配时使用更快的无掩码方法
+        if alpha is not None and alpha.min() < 255:
+            mask = np.where(alpha > 0, 255, 0).astype(np.uint8)
+        else:
+            mask = None
+
+        self._set_variants({'bgr': bgr, 'gray': cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)}, mask)
+
+    @classmethod
+    def from_variants(cls, name, path, mtime, decode_ms, variants, mask, color=True, channel='gray'):
+        """
+        使用预处理好的图像创建，用于从模板索引加载
+        variants: {通道: 图像}，至少包含'bgr'和'gray'
+        """
+        entry = cls.__new__(cls)
+        entry.name = name
+        entry.path = path
+        entry.mtime = mtime
+        entry.decode_ms = decode_ms
+        entry.checked_at = time.perf_counter()
+        entry.color = color
+        entry.channel = channel
+        entry._set_variants(dict(variants), mask)
+        return entry
+
+    def _set_variants(self, variants, mask):
+        """设置各通道的图像和掩码"""
+        self.bgr = variants['bgr']
+        self.gray = variants['gray']
+        self.mask = mask
+        self.height, self.width = self.bgr.shape[:2]
+        self._variants = variants
+        self._downscaled = {}
+        self._stats = {}
+
+    def match_channel(self, color=None):
+        """
+        匹配使用的通道
+        color: None使用模板自身的声明，True为BGR，False为单通道
+        """
+        if color is None:
+            color = self.color
+        return 'bgr' if color else self.channel
+
+    def variant(self, channel):
+        """指定通道的模板，首次使用时计算"""
+        image = self._variants.get(channel)
+        if image is None:
+            image = convert_channel(self.bgr, channel)
+            self._variants[channel] = image
+        return image
+
+    def stats(self, channel):
+        """
+        模板的均值和标准差，每个通道只计算一次，有掩码时只统计掩码内的像素
+        标准差为0的纯色模板无法使用归一化相关系数匹配
+        """
+        stats = self._stats.get(channel)
+        if stats is None:
+            mean, std = cv2.meanStdDev(self.variant(channel), mask=self.mask)
+            stats = (float(mean.mean()), float(std.max()))
+            self._stats[channel] = stats
+        return stats
+
+    def downscaled(self, level, channel='bgr'):
+        """按金字塔级别缩小的模板，首次使用时计算"""
+        key = (level, channel)
+        image = self._downscaled.get(key)
+        if image is None:
+            image = downscale(self.variant(channel), level)
+            self._downscaled[key] = image
+        return image
+
+    def downscaled_mask(self, level):
+        """按金字塔级别缩小的掩码，没有掩码时返回None"""
+        if self.mask is None:
+            return None
+        key = (level, 'mask')
+        mask = self._downscaled.get(key)
+        if mask is None:
+            mask = binarize_mask(downscale(self.mask, level))
+            self._downscaled[key] = mask
+        return mask
+
+
+class TemplateStore:
+    METADATA_FILE = 'templates.json'
+    INDEX_VERSION = 1
+
+    def __init__(self, templates_dir=None, max_entries=None, check_interval=1.0, color_default=True,
+                 index_file=None):
+        """
+        模板缓存：解码一次，之后直接从内存中取用
+        templates_dir: 模板目录，用于按名称查找模板，None表示只能按路径查找
+        max_entries: 最多缓存的模板数量，None表示不限制，超出时淘汰最久未使用的模板
+        check_interval: 检查模板文件修改时间的最小间隔（秒）
+        color_default: 未在templates.json中声明的模板是否按颜色匹配
+        index_file: build_index生成的模板索引文件，None表示不使用；索引过期时从模板目录加载
+        """
+        self.templates_dir = templates_dir
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.color_default = color_default
+        self.index_file = index_file
+        self.paths = {}  # 模板名称 -> 路径
+        self.metadata = {}  # 模板名称 -> {'color': bool, 'channel': str}
+        self._entries = OrderedDict()  # 路径 -> TemplateEntry
+        self._lock = threading.Lock()
+
+        # 模板索引，数组在首次使用时才从文件中读取
+        self._index = None
+        self._index_entries = {}  # 路径 -> 索引中的模板信息
+        self.index_status = None  # None（未使用）、'loaded'、'stale' 或 'missing'
+
+        # 统计信息
+        self.hits = 0
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.index_loads = 0
+        self._decode_time_total = 0.0
+        self._index_time_total = 0.0
+
+        self.refresh_index()
+
+    def refresh_index(self):
+        """重新扫描模板目录，有可用的模板索引时直接使用索引中的模板列表"""
+        if self.templates_dir:
+            if self.index_file and self._open_index():
+                return self.paths
+            self.paths = get_all_templates(self.templates_dir)
+            self.metadata = self._load_metadata()
+        return self.paths
+
+    def _metadata_mtime(self):
+        """templates.json的修改时间，不存在时返回None"""
+        metadata_path = os.path.join(self.templates_dir, self.METADATA_FILE)
+        return os.path.getmtime(metadata_path) if os.path.exists(metadata_path) else None
+
+    def _directory_mtimes(self):
+        """模板目录及其子目录的修改时间，添加、删除或重命名模板时会变化"""
+        mtimes = {}
+        for root, dirs, files in os.walk(self.templates_dir):
+            rel_path = os.path.relpath(root, self.templates_dir).replace(os.sep, '/')
+            mtimes[rel_path] = os.path.getmtime(root)
+        return mtimes
+
+    def _index_is_fresh(self, meta):
+        """检查索引记录的目录和templates.json修改时间是否与磁盘一致"""
+        if meta.get('version') != self.INDEX_VERSION:
+            return False
+        if meta.get('metadata_mtime') != self._metadata_mtime():
+            return False
+        for rel_path, mtime in meta.get('directories', {}).items():
+            path = os.path.join(self.templates_dir, *rel_path.split('/'))
+            try:
+                if os.path.getmtime(path) != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _close_index(self):
+        """关闭模板索引文件"""
+        if self._index is not None:
+            self._index.close()
+        self._index = None
+        self._index_entries = {}
+
+    def _open_index(self):
+        """
+        打开模板索引，只读取模板列表，数组在加载模板时才读取
+        返回: 索引是否可用
+        """
+        self._close_index()
+        if not os.path.exists(self.index_file):
+            self.index_status = 'missing'
+            return False
+
+        try:
+            index = np.load(self.index_file, allow_pickle=False)
+            meta = json.loads(index['__meta__'].tobytes().decode('utf-8'))
+        except Exception as e:
+            print(f"读取模板索引失败: {e}")
+            self.index_status = 'missing'
+            return False
+
+        if not self._index_is_fresh(meta):
+            print("模板索引已过期，从模板目录加载模板")
+            index.close()
+            self.index_status = 'stale'
+            return False
+
+        self._index = index
+        self.paths = {}
+        for name, info in meta['templates'].items():
+            path = os.path.join(self.templates_dir, *info['path'].split('/'))
+            self.paths[name] = path
+            self._index_entries[path] = dict(info, name=name)
+        self.metadata = meta.get('metadata', {})
+        self.index_status = 'loaded'
+        return True
+
+    def build_index(self, output=None):
+        """
+        将模板目录中的所有模板及其预处理结果打包为一个索引文件（.npz）
+        output: 索引文件路径，None时使用index_file；不要放在模板目录中，否则写入后索引立即过期
+        返回: 打包的模板数量
+        """
+        output = output or self.index_file
+        if not self.templates_dir or not output:
+            raise ValueError("需要指定模板目录和索引文件路径")
+        templates_dir = os.path.abspath(self.templates_dir)
+        if os.path.abspath(output).startswith(templates_dir + os.sep):
+            print("警告: 索引文件位于模板目录中，写入后索引会被判定为过期")
+
+        paths = get_all_templates(self.templates_dir)
+        metadata = self._load_metadata()
+        directories = self._directory_mtimes()
+        metadata_mtime = self._metadata_mtime()
+
+        arrays = {}
+        templates = {}
+        for i, (name, path) in enumerate(sorted(paths.items())):
+            image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                print(f"读取模板 {name} 失败，跳过")
+                continue
+            options = metadata.get(name, {})
+            entry = TemplateEntry(
+                name, path, image, os.path.getmtime(path), 0.0,
+                color=options.get('color', self.color_default),
+                channel=options.get('channel', 'gray'))
+
+            key = f"t{i}"
+            channels = ['bgr', 'gray']
+            if entry.channel not in channels:
+                channels.append(entry.channel)
+            for channel in channels:
+                arrays[f"{key}_{channel}"] = entry.variant(channel)
+            if entry.mask is not None:
+                arrays[f"{key}_mask"] = entry.mask
+            templates[name] = {
+                'key': key,
+                'path': os.path.relpath(path, self.templates_dir).replace(os.sep, '/'),
+                'mtime': entry.mtime,
+                'channels': channels,
+                'mask': entry.mask is not None
+            }
+
+        meta = {
+            'version': self.INDEX_VERSION,
+            'templates': templates,
+            'metadata': metadata,
+            'metadata_mtime': metadata_mtime,
+            'directories': directories
+        }
+        arrays['__meta__'] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+        # 先写入临时文件再替换，避免运行中的程序读到不完整的索引
+        directory = os.path.dirname(output)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = output + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, output)
+        return len(templates)
+
+    def _load_metadata(self):
+        """
+        读取模板目录中的templates.json，格式为:
+        {"模板名称": {"color": false, "channel": "gray"}, ...}
+        """
+        metadata_path = os.path.join(self.templates_dir, self.METADATA_FILE)
+        if not os.path.exists(metadata_path):
+            return {}
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except Exception as e:
+            print(f"读取模板配置失败: {e}")
+            return {}
+
+        for name, options in metadata.items():
+            channel = options.get('channel', 'gray')
+            if channel not in CHANNELS or channel == 'bgr':
+                print(f"模板 {name} 的通道 {channel} 无效，使用灰度")
+                options['channel'] = 'gray'
+        return metadata
+
+    def names(self):
+        """所有模板名称"""
+        return list(self.paths.keys())
+
+    def resolve(self, name_or_path):
+        """将模板名称转换为路径，不是已知名称时按路径处理"""
+        return self.paths.get(name_or_path, name_or_path)
+
+    def _load_from_index(self, path, info, mtime):
+        """从模板索引中读取预处理好的模板"""
+        start = time.perf_counter()
+        key = info['key']
+        variants = {channel: self._index[f"{key}_{channel}"] for channel in info['channels']}
+        mask = self._index[f"{key}_mask"] if info['mask'] else None
+        self._index_time_total += time.perf_counter() - start
+        self.index_loads += 1
+
+        options = self.metadata.get(info['name'], {})
+        return TemplateEntry.from_variants(
+            info['name'], path, mtime, (time.perf_counter() - start) * 1000, variants, mask,
+            color=options.get('color', self.color_default),
+            channel=options.get('channel', 'gray'))
+
+    def _load(self, path, mtime):
+        """解码模板文件，模板索引中的版本未过期时直接从索引读取"""
+        info = self._index_entries.get(path)
+        if info is not None and info['mtime'] == mtime:
+            try:
+                return self._load_from_index(path, info, mtime)
+            except Exception as e:
+                print(f"从模板索引读取 {info['name']} 失败: {e}")
+
+        start = time.perf_counter()
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise FileNotFoundError(f"找不到模板图像: {path}")
+        decode_time = time.perf_counter() - start
+        self._decode_time_total += decode_time
+
+        # 优先使用模板目录中的名称（包含子目录前缀）
+        name = next((name for name, p in self.paths.items() if p == path), None)
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+        options = self.metadata.get(name, {})
+        return TemplateEntry(
+            name, path, image, mtime, decode_time * 1000,
+            color=options.get('color', self.color_default),
+            channel=options.get('channel', 'gray'))
+
+    def get(self, name_or_path):
+        """
+        获取模板
+        name_or_path: 模板名称或文件路径
+        返回: TemplateEntry，文件不存在时抛出FileNotFoundError
+        """
+        path = self.resolve(name_or_path)
+        now = time.perf_counter()
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                if now - entry.checked_at < self.check_interval:
+                    self.hits += 1
+                    return entry
+
+                # 文件未修改时继续使用缓存
+                entry.checked_at = now
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    mtime = entry.mtime
+                if mtime == entry.mtime:
+                    self.hits += 1
+                    return entry
+                self.reloads += 1
+            else:
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    raise FileNotFoundError(f"找不到模板图像: {path}")
+
+            entry = self._load(path, mtime)
+            self.loads += 1
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+
+            # 淘汰最久未使用的模板
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return entry
+
+    def preload(self):
+        """解码模板目录中的所有模板，返回成功加载的数量"""
+        count = 0
+        for name in self.names():
+            try:
+                self.get(name)
+                count += 1
+            except Exception as e:
+                print(f"预加载模板 {name} 失败: {e}")
+        return count
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            loads = self.loads
+            decodes = loads - self.index_loads
+            avg_decode_ms = self._decode_time_total * 1000 / decodes if decodes else 0.0
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'loads': loads,
+                'reloads': self.reloads,
+                'evictions': self.evictions,
+                'avg_decode_ms': avg_decode_ms,
+                'decode_ms_saved': self.hits * avg_decode_ms,
+                'index': self.index_status,
+                'index_loads': self.index_loads,
+                'avg_index_ms': self._index_time_total * 1000 / self.index_loads if self.index_loads else 0.0
+            }
@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+
+
+class LocationTracker:
+    def __init__(self, margin=16, max_keys=256):
+        """
+        上次位置跟踪：界面元素通常出现在上次找到的位置，先在其附近的小窗口中匹配，未找到时再搜索整个区域
+        margin: 小窗口在模板四周额外扩展的像素
+        max_keys: 最多记住的位置数量
+        """
+        self.margin = margin
+        self.max_keys = max_keys
+        self._locations = OrderedDict()  # key -> (x, y)，相对搜索区域的模板左上角
+        self._lock = threading.Lock()
+
+        # 统计信息，按模板名称（key的第一个元素）分组
+        self._stats = {}
+
+    def window(self, key, template_size, screen_size):
+        """
+        计算上次位置附近的搜索窗口
+        template_size: 模板尺寸 (width, height)
+        screen_size: 搜索区域尺寸 (width, height)
+        返回: (x, y, width, height)，相对搜索区域；没有上次位置或窗口不比区域小时返回None
+        """
+        with self._lock:
+            location = self._locations.get(key)
+        if location is None:
+            return None
+
+        tw, th = template_size
+        sw, sh = screen_size
+        x0 = max(0, location[0] - self.margin)
+        y0 = max(0, location[1] - self.margin)
+        x1 = min(sw, location[0] + tw + self.margin)
+        y1 = min(sh, location[1] + th + self.margin)
+        if x1 - x0 < tw or y1 - y0 < th or (x1 - x0) * (y1 - y0) >= sw * sh:
+            return None
+        return x0, y0, x1 - x0, y1 - y0
+
+    def _name_stats(self, key):
+        """按模板名称取统计项"""
+        stats = self._stats.get(key[0])
+        if stats is None:
+            stats = {'searches': 0, 'window_tries': 0, 'window_hits': 0, 'area': 0, 'full_area': 0}
+            self._stats[key[0]] = stats
+        return stats
+
+    def record(self, key, location, searched_area, full_area, window_tried=False, window_hit=False):
+        """
+        记录一次搜索
+        location: 找到的模板左上角 (x, y)，相对搜索区域；None表示没有找到，会忘记上次位置
+        searched_area: 本次实际匹配的像素面积
+        full_area: 整个搜索区域的像素面积
+        """
+        with self._lock:
+            if location is None:
+                self._locations.pop(key, None)
+            else:
+                self._locations[key] = location
+                self._locations.move_to_end(key)
+                while len(self._locations) > self.max_keys:
+                    self._locations.popitem(last=False)
+
+            stats = self._name_stats(key)
+            stats['searches'] += 1
+            stats['area'] += searched_area
+            stats['full_area'] += full_area
+            if window_tried:
+                stats['window_tries'] += 1
+            if window_hit:
+                stats['window_hits'] += 1
+
+    def reset(self):
+        """忘记所有位置"""
+        with self._lock:
+            self._locations.clear()
+
+    def get_stats(self):
+        """
+        获取跟踪统计，返回 {模板名称: {...}}
+        hit_rate: 小窗口命中次数 / 小窗口尝试次数
+        mean_search_area: 每次搜索实际匹配的平均像素面积（小窗口未命中时包含两次匹配）
+        area_ratio: 实际匹配面积 / 每次都搜索整个区域的面积
+        """
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                searches = stats['searches']
+                tries = stats['window_tries']
+                result[name] = {
+                    'searches': searches,
+                    'window_tries': tries,
+                    'window_hits': stats['window_hits'],
+                    'hit_rate': stats['window_hits'] / tries if tries else 0.0,
+                    'mean_search_area': stats['area'] / searches if searches else 0.0,
+                    'mean_full_area': stats['full_area'] / searches if searches else 0.0,
+                    'area_ratio': stats['area'] / stats['full_area'] if stats['full_area'] else 0.0
+                }
+            return result
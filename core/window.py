@@ -1,10 +1,15 @@
-import win32gui
-import win32con
-import win32api
 import time
 import random
 import ctypes
 
+# pywin32仅在Windows上可用，缺失时窗口相关功能返回默认值
+try:
+    import win32gui
+    import win32con
+    import win32api
+except ImportError:
+    win32gui = win32con = win32api = None
+
 class GameWindow:
     def __init__(self, window_name="PokeMMO", use_partial_match=True):
         self.window_name = window_name
@@ -15,6 +20,10 @@ class GameWindow:
     
     def find_window(self):
         """查找并获取游戏窗口句柄"""
+        if win32gui is None:
+            print("警告：未安装pywin32，无法查找窗口")
+            return None
+        
         # 尝试直接通过完整窗口名查找
         self.hwnd = win32gui.FindWindow(None, self.window_name)
         
@@ -9,8 +9,9 @@ import threading
 import keyboard
 import cv2
 
-from core import GameWindow, ImageManager, OCRManager, InputManager, AlertManager
-from utils import load_config, save_config, create_directory, get_all_templates
+from core import GameWindow, ImageManager, OCRManager, InputManager, AlertManager, TemplateStore
+from core.debug import DebugSink
+from utils import load_config, save_config, create_directory
 
 class PokeMMOAutoBot:
     def __init__(self, config_path="config.json"):
@@ -60,7 +61,40 @@ class PokeMMOAutoBot:
             
             # 初始化图像管理器
             print("初始化图像管理器...")
-            self.image_manager = ImageManager(self.game_window)
+            template_config = self.config.get("template_store", {})
+            self.template_store = TemplateStore(
+                self.config["templates_dir"],
+                max_entries=template_config.get("max_entries"),
+                check_interval=template_config.get("check_interval", 1.0),
+                color_default=template_config.get("color_default", True),
+                index_file=template_config.get("index_file")
+            )
+            capture_config = self.config.get("capture", {})
+            self.image_manager = ImageManager(
+                self.game_window,
+                frame_max_age=capture_config.get("frame_max_age", 0.05),
+                template_store=self.template_store
+            )
+            self.image_manager.debug_sink = DebugSink.from_config(self.config)
+            detection_config = self.config.get("detection", {})
+            self.image_manager.match_mode = detection_config.get("match_mode", "exact")
+            self.image_manager.pyramid_level = detection_config.get("pyramid_level", 1)
+            if detection_config.get("change_gate", False):
+                self.image_manager.enable_change_gate(
+                    threshold=detection_config.get("change_threshold", 8)
+                )
+            if detection_config.get("location_tracking", False):
+                self.image_manager.enable_location_tracking(
+                    margin=detection_config.get("tracking_margin", 16)
+                )
+            if detection_config.get("multi_scale", False):
+                self.image_manager.enable_multi_scale(
+                    min_scale=detection_config.get("scale_min", 0.5),
+                    max_scale=detection_config.get("scale_max", 2.0),
+                    step=detection_config.get("scale_step", 0.05),
+                    reference_size=detection_config.get("reference_size"),
+                    retry_interval=detection_config.get("scale_retry_interval", 2.0)
+                )
             
             # 初始化OCR管理器
             ocr_enable = self.config["ocr"].get("enable", True)
@@ -70,8 +104,25 @@ class PokeMMOAutoBot:
                 self.ocr_manager = OCRManager(
                     self.game_window, 
                     self.image_manager,
-                    ocr_lang
+                    ocr_lang,
+                    mode=self.config["ocr"].get("mode", "full"),
+                    warmup=self.config["ocr"].get("warmup", True),
+                    workers=self.config["ocr"].get("workers", 0)
                 )
+                cache_config = self.config["ocr"].get("cache", {})
+                if cache_config.get("enable", True):
+                    self.ocr_manager.enable_result_cache(
+                        ttl=cache_config.get("ttl", 5.0),
+                        max_entries=cache_config.get("max_entries", 64),
+                        max_mb=cache_config.get("max_mb", 4)
+                    )
+                scheduler_config = self.config["ocr"].get("scheduler", {})
+                if scheduler_config.get("enable", True):
+                    self.ocr_manager.enable_scheduler(
+                        coalesce_window=scheduler_config.get("coalesce_window", 0.05),
+                        background_idle=scheduler_config.get("background_idle", 0.2),
+                        background_max_wait=scheduler_config.get("background_max_wait", 2.0)
+                    )
             else:
                 print("OCR功能已禁用")
                 self.ocr_manager = None
@@ -91,7 +142,10 @@ class PokeMMOAutoBot:
             
             # 加载模板
             print("加载图像模板...")
-            self.templates = get_all_templates(self.config["templates_dir"])
+            self.templates = self.template_store.paths
+            if template_config.get("preload", True):
+                loaded = self.template_store.preload()
+                print(f"预先解码了 {loaded} 个模板图像")
             print(f"加载了 {len(self.templates)} 个模板图像")
             
             # 运行状态
@@ -144,6 +198,14 @@ class PokeMMOAutoBot:
         self.paused = False
         self.stop_event.clear()
         
+        # 启动后台截图
+        capture_config = self.config.get("capture", {})
+        if capture_config.get("background", False):
+            self.image_manager.start_background_capture(
+                fps=capture_config.get("background_fps", 20),
+                buffer_size=capture_config.get("buffer_size", 3)
+            )
+        
         # 启动验证码检测
         if self.alert_manager:
             self.alert_manager.start_captcha_check(self.captcha_detected_callback)
@@ -164,6 +226,55 @@ class PokeMMOAutoBot:
         # 停止验证码检测
         if self.alert_manager:
             self.alert_manager.stop_captcha_check()
+        
+        # 停止后台截图并输出统计信息
+        capture_stats = self.image_manager.get_background_capture_stats()
+        if capture_stats:
+            print(f"后台截图: {capture_stats['frames']} 帧，{capture_stats['fps']:.1f} fps，"
+                  f"丢帧 {capture_stats['dropped']}，过期读取 {capture_stats['stale_reads']}，"
+                  f"平均耗时 {capture_stats['avg_capture_ms']:.1f} ms")
+        self.image_manager.stop_background_capture()
+        
+        # 写完队列中剩余的调试截图
+        debug_sink = self.image_manager.debug_sink
+        if debug_sink is not None:
+            debug_sink.close()
+            debug_stats = debug_sink.get_stats()
+            if debug_stats['written']:
+                print(f"调试截图: 保存 {debug_stats['written']} 张，丢弃 {debug_stats['dropped']} 张，"
+                      f"平均写入 {debug_stats['avg_write_ms']:.1f} ms")
+        
+        # 输出位置跟踪统计
+        tracking_stats = self.image_manager.get_location_tracking_stats()
+        if tracking_stats:
+            for name, stats in tracking_stats.items():
+                print(f"位置跟踪 {os.path.basename(name)}: 小窗口命中率 {stats['hit_rate']:.1%}，"
+                      f"平均搜索面积为整个区域的 {stats['area_ratio']:.1%}")
+        
+        # 输出OCR结果缓存统计
+        if self.ocr_manager:
+            cache_stats = self.ocr_manager.get_result_cache_stats()
+            if cache_stats:
+                print(f"OCR结果缓存: 命中 {cache_stats['hits']} 次，命中率 {cache_stats['hit_rate']:.1%}，"
+                      f"节省识别时间 {cache_stats['saved_ms']:.0f} ms")
+            service_stats = self.ocr_manager.get_service_stats()
+            if service_stats:
+                print(f"OCR工作进程: {service_stats['ready_workers']}/{service_stats['workers']} 个就绪，"
+                      f"完成 {service_stats['completed']} 次，平均识别 {service_stats['avg_infer_ms']:.0f} ms，"
+                      f"平均往返 {service_stats['avg_roundtrip_ms']:.0f} ms")
+            scheduler_stats = self.ocr_manager.get_scheduler_stats()
+            if scheduler_stats:
+                for priority, stats in scheduler_stats['priorities'].items():
+                    print(f"OCR调度 {priority}: 请求 {stats['submitted']} 次，合并 {stats['coalesced']} 次，"
+                          f"平均等待 {stats['avg_wait_ms']:.0f} ms，最长等待 {stats['max_wait_ms']:.0f} ms")
+                print(f"OCR调度队列最大深度 {scheduler_stats['max_queue_depth']}")
+        
+        # 输出多尺度匹配统计
+        scale_stats = self.image_manager.get_scale_stats()
+        if scale_stats:
+            for size, scale in scale_stats['scales'].items():
+                print(f"客户区 {size[0]}x{size[1]}: 模板缩放比例 {scale if scale is not None else '未确定'}")
+            print(f"缩放比例搜索 {scale_stats['searches']} 次，平均耗时 {scale_stats['avg_search_ms']:.1f} ms")
     
     def toggle_pause(self):
         """切换暂停状态"""
@@ -188,6 +299,9 @@ class PokeMMOAutoBot:
                 # 示例功能：在屏幕上查找并点击物品按钮
                 print("在屏幕上寻找目标...")
                 
+                # 按上一轮请求过的区域截图，避免截取整个窗口
+                self.image_manager.begin_tick()
+                
                 # 示例图片模板查找
                 template_name = "1"  # 替换为实际模板名称
                 if template_name in self.templates:
@@ -216,6 +330,9 @@ class PokeMMOAutoBot:
             import traceback
             traceback.print_exc()
             self.stop()
+        finally:
+            # 释放本线程的截图资源，每次启动都会创建新的主循环线程
+            self.image_manager.release_thread()
     
     def run_example(self):
         """运行示例任务"""
@@ -257,7 +374,12 @@ class PokeMMOAutoBot:
                 traceback.print_exc()
             
             # 示例：查找文字 - 这可能比较慢，所以要捕获可能的异常
-            if self.ocr_manager:
+            if not self.ocr_manager:
+                print("跳过OCR文字识别 (OCR未启用)")
+            elif not self.ocr_manager.is_ready():
+                # OCR模型在后台加载，示例不等待
+                print("跳过OCR文字识别 (OCR模型尚未就绪)")
+            else:
                 print("尝试进行OCR文字识别...")
                 try:
                     text_results = self.ocr_manager.recognize_text()
@@ -271,8 +393,6 @@ class PokeMMOAutoBot:
                     print(f"OCR识别失败: {e}")
                     import traceback
                     traceback.print_exc()
-            else:
-                print("跳过OCR文字识别 (OCR未启用)")
             
             # 示例：查找特定颜色
             print("尝试查找颜色...")
@@ -298,6 +418,7 @@ class PokeMMOAutoBot:
 
 def main():
     """主函数入口点"""
+    bot = None
     try:
         # 创建自动化机器人
         bot = PokeMMOAutoBot()
@@ -324,6 +445,15 @@ def main():
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        # 停止OCR工作进程，写完剩余的调试截图
+        if bot is not None:
+            if bot.ocr_manager:
+                bot.ocr_manager.close()
+            if bot.image_manager.debug_sink is not None:
+                bot.image_manager.debug_sink.close()
+            # 释放截图资源
+            bot.image_manager.release()
     
     return 0
 
@@ -9,7 +9,7 @@ import os
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core import GameWindow, ImageManager, OCRManager, InputManager, AlertManager
+from core import GameWindow, ImageManager, OCRManager, OCRNotReady, InputManager, AlertManager
 from utils import load_config, save_config, create_directory, get_all_templates
 
 class FishingTask:
@@ -37,6 +37,8 @@ class FishingTask:
                 "center": (100, 100, 400, 300)  # 自定义区域 (x, y, width, height)
             },
             "fishing_rod_key": "1",  # 钓鱼竿物品栏位置对应的快捷键
+            "poll_frame_max_age": 0.5,  # 每轮检测共用同一帧的最长时间（秒）
+            "color_probe_stride": 4,  # 咬钩颜色检测的采样间隔（像素）
         }
         
         # 钓鱼状态
@@ -147,27 +149,34 @@ class FishingTask:
                 time.sleep(0.5)
                 continue
             
-            # 方法1：OCR检测文字提示
+            # 每轮检测只截图一次，之后的文字、模板和颜色检测都从这次截图中裁剪
+            self.image_manager.begin_tick(max_age=self.fishing_config["poll_frame_max_age"])
+            
+            # 方法1：OCR检测文字提示，识别一次查找所有关键词；OCR尚未就绪时只用模板和颜色检测
+            try:
+                text_matches = self.ocr_manager.find_texts(bite_keywords, region=region)
+            except OCRNotReady:
+                text_matches = dict.fromkeys(bite_keywords)
             for keyword in bite_keywords:
-                text_pos = self.ocr_manager.find_text(keyword, region=region)
-                if text_pos:
+                if text_matches[keyword]:
                     print(f"检测到咬钩文字: '{keyword}'")
                     time.sleep(self.game_window.random_delay(0.1, 0.3))  # 短暂延迟，模拟反应时间
                     return True
             
-            # 方法2：图像模板匹配
-            for template_name in bite_templates:
-                if template_name in self.templates:
-                    template_path = self.templates[template_name]
-                    result = self.image_manager.find_template(template_path, region=region)
-                    if result:
-                        print(f"检测到咬钩图标，匹配度: {result[2]:.2f}")
-                        time.sleep(self.game_window.random_delay(0.1, 0.3))  # 短暂延迟，模拟反应时间
-                        return True
+            # 方法2：图像模板匹配，所有模板在同一帧上并行匹配
+            template_paths = [self.templates[name] for name in bite_templates if name in self.templates]
+            results = self.image_manager.find_templates(template_paths, region=region, first_hit=True)
+            for template_path, result in results.items():
+                if result:
+                    print(f"检测到咬钩图标，匹配度: {result[2]:.2f}")
+                    time.sleep(self.game_window.random_delay(0.1, 0.3))  # 短暂延迟，模拟反应时间
+                    return True
             
             # 方法3：特定颜色检测（如感叹号的颜色）
             exclamation_color = (255, 255, 0)  # 黄色
-            color_pos = self.image_manager.find_color(exclamation_color, tolerance=30, region=region)
+            color_pos = self.image_manager.find_color(
+                exclamation_color, tolerance=30, region=region, probe=True,
+                stride=self.fishing_config["color_probe_stride"])
             if color_pos:
                 print(f"检测到咬钩颜色: {exclamation_color} 在位置 {color_pos}")
                 time.sleep(self.game_window.random_delay(0.1, 0.3))  # 短暂延迟，模拟反应时间
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+GDI截图测试：用假win32层模拟GDI截图，检查规划截图的内容和截图池的释放
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'benchmarks'))
+
+import fake_win32
+from core import capture, window
+from core.image import ImageManager
+
+
+def make_image_manager(monkeypatch, screen):
+    """安装假win32模块，返回通过GDI截图的ImageManager"""
+    fake_gdi32 = fake_win32.install(screen)
+    for module, names in ((capture, ('win32gui', 'win32ui', 'win32con')),
+                          (window, ('win32gui', 'win32con', 'win32api'))):
+        for name in names:
+            monkeypatch.setattr(module, name, sys.modules[name])
+    monkeypatch.setattr(capture, '_gdi32', fake_gdi32)
+    return ImageManager(window.GameWindow())
+
+
+def test_same_size_rects_keep_their_own_pixels(monkeypatch):
+    rng = np.random.default_rng(0)
+    screen = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    image_manager = make_image_manager(monkeypatch, screen)
+
+    # 两个相距很远的同尺寸区域，规划后仍是两次截图
+    regions = [(10, 20, 100, 100), (500, 360, 100, 100)]
+    rects = image_manager.begin_tick(regions)
+    assert len(rects) == 2
+
+    for x, y, w, h in regions:
+        crop = image_manager.capture_screen((x, y, w, h))
+        assert np.array_equal(crop, screen[y:y + h, x:x + w])
+
+
+def capture_in_thread(image_manager, release):
+    """在新线程中截图一次，release为True时线程结束前释放截图池"""
+    def run():
+        image_manager.capture_screen((0, 0, 50, 50))
+        if release:
+            image_manager.release_thread()
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+
+def test_thread_pools_are_released(monkeypatch):
+    screen = np.zeros((120, 160, 3), dtype=np.uint8)
+    image_manager = make_image_manager(monkeypatch, screen)
+    source = image_manager.frame_source
+
+    # 线程结束前主动释放
+    capture_in_thread(image_manager, release=True)
+    assert source._pools == []
+
+    # 没有主动释放的线程结束后，下一个线程创建截图池时清理
+    capture_in_thread(image_manager, release=False)
+    assert len(source._pools) == 1
+    image_manager.capture_screen((0, 0, 50, 50))
+    assert [thread for thread, _ in source._pools] == [threading.current_thread()]
+
+    image_manager.release()
+    assert source._pools == []
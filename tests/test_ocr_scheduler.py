@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+OCR请求调度器测试：优先级、为任务请求保留的执行位置和相同请求的合并
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from core.ocr_scheduler import OCRScheduler
+
+
+def job(name, duration, log):
+    """返回一个耗时duration秒的识别函数，开始时记录 (名称, 开始时间)"""
+    def compute():
+        log.append((name, time.perf_counter()))
+        time.sleep(duration)
+        return name
+    return compute
+
+
+def test_task_not_queued_behind_background_scan():
+    # 空闲时间远大于两次任务请求之间的间隙，后台扫描只能在任务结束后执行
+    scheduler = OCRScheduler(concurrency=1, background_idle=1.0, background_max_wait=10.0)
+    log = []
+    try:
+        first = scheduler.submit('task1', job('task1', 0.1, log), 'task')
+        scan = scheduler.submit('captcha', job('captcha', 0.5, log), 'background')
+        first.result(timeout=5)
+
+        # 任务请求的间隙中后台扫描不能占用唯一的执行位置
+        time.sleep(0.05)
+        second = scheduler.submit('task2', job('task2', 0.1, log), 'task')
+        second.result(timeout=5)
+        assert not scan.done()
+        scan.result(timeout=5)
+    finally:
+        scheduler.close()
+
+    assert [name for name, _ in log] == ['task1', 'task2', 'captcha']
+
+    stats = scheduler.get_stats()['priorities']
+    assert stats['task']['executed'] == 2
+    assert stats['background']['executed'] == 1
+    assert stats['task']['coalesced'] == stats['background']['coalesced'] == 0
+
+
+def test_background_runs_after_max_wait():
+    # 任务空闲时间远大于最长等待时间和超时，后台请求只能因等待过久而执行
+    scheduler = OCRScheduler(concurrency=1, background_idle=60.0, background_max_wait=0.2)
+    log = []
+    try:
+        scheduler.submit('task', job('task', 0.0, log), 'task').result(timeout=5)
+        assert scheduler.run('captcha', job('captcha', 0.0, log), 'background', timeout=5) == 'captcha'
+    finally:
+        scheduler.close()
+
+    assert [name for name, _ in log] == ['task', 'captcha']
+    assert scheduler.get_stats()['priorities']['background']['executed'] == 1
+
+
+def test_identical_requests_are_coalesced():
+    scheduler = OCRScheduler(concurrency=1, coalesce_window=0.5, background_idle=0.0)
+    log = []
+    try:
+        background = scheduler.submit(('region', 0.6, 'full'), job('scan', 0.1, log), 'background')
+        task = scheduler.submit(('region', 0.6, 'full'), job('duplicate', 0.1, log), 'task')
+        assert task is background
+        assert task.result(timeout=5) == 'scan'
+    finally:
+        scheduler.close()
+
+    assert [name for name, _ in log] == ['scan']
+    assert scheduler.get_stats()['priorities']['task']['coalesced'] == 1
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+多尺度匹配的缩放比例缓存测试
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from core.scaling import ScaleCache, scale_image
+
+
+def make_template(rng):
+    """纹理丰富的模板，缩放后仍能唯一匹配"""
+    template = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(template, (3, 3), 0)
+
+
+def test_template_absent_on_first_sweep_is_searched_again():
+    rng = np.random.default_rng(0)
+    template = make_template(rng)
+    size = (1920, 1080)
+    key = ('bite.png', 'bgr')
+    cache = ScaleCache(min_scale=1.0, max_scale=2.0, step=0.1, retry_interval=0.0)
+
+    # 第一次搜索时模板还没出现在画面上
+    blank = np.full((240, 320, 3), 128, dtype=np.uint8)
+    assert cache.should_search(size, key)
+    _, score = cache.search(size, key, blank, template, 0.9)
+    assert score < 0.9
+    assert cache.get_scale(size) is None
+
+    # 之后模板以1.5倍出现，冷却结束后重新搜索并记住该比例
+    screen = blank.copy()
+    scaled = scale_image(template, 1.5)
+    screen[100:100 + scaled.shape[0], 120:120 + scaled.shape[1]] = scaled
+    assert cache.should_search(size, key)
+    scale, score = cache.search(size, key, screen, template, 0.9)
+    assert scale == 1.5 and score >= 0.9
+    assert cache.get_scale(size) == 1.5
+    assert not cache.should_search(size, key)
+
+
+def test_failed_template_waits_for_retry_interval():
+    rng = np.random.default_rng(1)
+    template = make_template(rng)
+    size = (1280, 720)
+    key = ('bite.png', 'bgr')
+    cache = ScaleCache(min_scale=1.0, max_scale=1.2, step=0.1, retry_interval=3600.0)
+
+    blank = np.full((120, 160, 3), 128, dtype=np.uint8)
+    cache.search(size, key, blank, template, 0.9)
+    assert not cache.should_search(size, key)
+    # 其他模板不受影响
+    assert cache.should_search(size, ('other.png', 'bgr'))